@@ -5,11 +5,17 @@ import sys
 import asyncio
 import uuid
 from pathlib import Path
+from typing import Optional
 
 from .config import BotConfig
 from .database.repository import Repository
 from .comfyui.client import ComfyUIClient
-from .comfyui.websocket import ComfyUIWebSocket
+from .comfyui.websocket import (
+    ComfyUIWebSocket,
+    INITIAL_BACKOFF,
+    MAX_BACKOFF,
+    BACKOFF_MULTIPLIER,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +59,11 @@ class ComfyUIBot(commands.Bot):
             self.delivery_service
         )
         self.permission_service = PermissionService(self.repository)
+
+        # Background startup tasks
+        self._commands_synced = False
+        self._sync_task: Optional[asyncio.Task] = None
+        self._comfy_task: Optional[asyncio.Task] = None
         
     async def setup_hook(self):
         """Async setup before bot starts."""
@@ -62,25 +73,62 @@ class ComfyUIBot(commands.Bot):
         await self.repository.init_db()
         logger.info("Database initialized.")
         
-        # Connect to ComfyUI WebSocket
-        try:
-            await self.comfy_ws.connect()
-            await self.job_manager.start()
-        except Exception as e:
-            logger.warning(f"Could not connect to ComfyUI WebSocket at start: {e}")
-            # We don't crash, as ComfyUI might come up later
+        # Connect to ComfyUI WebSocket in the background so a slow or
+        # offline ComfyUI doesn't hold up READY
+        if self._comfy_task is None:
+            self._comfy_task = asyncio.create_task(self._ensure_comfy())
             
         # Load Cogs
         await self._load_cogs()
         
         # Sync Commands
         # In production, sync might be manual or per-guild to avoid rate limits
-        # For simplicity in this self-hosted bot, we'll sync global
+        # For simplicity in this self-hosted bot, we'll sync global.
+        # Run in the background so a rate-limited sync can't block READY.
+        if not self._commands_synced and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_commands())
+
+    async def _ensure_comfy(self):
+        """Connect to ComfyUI, retrying with backoff until it comes up."""
+        task = asyncio.current_task()
+        delay = INITIAL_BACKOFF
         try:
+            while True:
+                try:
+                    if await self.comfy_ws.connect():
+                        await self.job_manager.start()
+                    # False means disconnect was requested during shutdown
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # We don't crash, as ComfyUI might come up later
+                    logger.warning(
+                        f"Could not connect to ComfyUI WebSocket: {e}. "
+                        f"Retrying in {delay:.0f}s..."
+                    )
+                await asyncio.sleep(delay)
+                delay = min(delay * BACKOFF_MULTIPLIER, MAX_BACKOFF)
+        finally:
+            if self._comfy_task is task:
+                self._comfy_task = None
+
+    async def _sync_commands(self):
+        """Sync the slash command tree once, off the setup path."""
+        task = asyncio.current_task()
+        try:
+            if self._commands_synced:
+                return
             synced = await self.tree.sync()
+            self._commands_synced = True
             logger.info(f"Synced {len(synced)} slash commands.")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Failed to sync commands: {e}")
+        finally:
+            if self._sync_task is task:
+                self._sync_task = None
 
     async def _load_cogs(self):
         """Load extensions from cogs directory."""
@@ -96,12 +144,15 @@ class ComfyUIBot(commands.Bot):
             "bot.cogs.admin",
         ]
         
+        # One directory listing instead of a stat() per extension
+        existing = {p.name for p in cogs_dir.iterdir() if p.suffix == ".py"}
+
         for ext in extensions:
             try:
                 # Check if file exists first to avoid confusing errors if we haven't created it yet
                 # (Since we are building incrementally)
                 module_name = ext.split(".")[-1]
-                if (cogs_dir / f"{module_name}.py").exists():
+                if f"{module_name}.py" in existing:
                     await self.load_extension(ext)
                     logger.info(f"Loaded extension: {ext}")
                 else:
@@ -112,6 +163,10 @@ class ComfyUIBot(commands.Bot):
     async def close(self):
         """Cleanup on shutdown."""
         logger.info("Shutting down bot...")
+        if self._sync_task and not self._sync_task.done():
+            self._sync_task.cancel()
+        if self._comfy_task and not self._comfy_task.done():
+            self._comfy_task.cancel()
         await self.comfy_client.close()
         await self.comfy_ws.disconnect()
         await self.repository.close()
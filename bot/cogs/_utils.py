@@ -0,0 +1,34 @@
+"""Shared helpers for bot cogs."""
+
+import asyncio
+import logging
+from typing import Coroutine, Any, Set
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def truncate(text: str, limit: int) -> str:
+    """Cut text to limit characters, marking the cut with a single ellipsis character."""
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def spawn(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def persist_message_id(bot, interaction: discord.Interaction, prompt_id: str) -> None:
+    """Store the interaction's response message ID on the job for later updates."""
+    try:
+        original_message = await interaction.original_response()
+        await bot.repository.update_job_message(prompt_id, original_message.id)
+    except Exception as e:
+        logger.error(f"Failed to store message ID for prompt {prompt_id}: {e}")
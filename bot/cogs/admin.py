@@ -21,6 +21,9 @@ class AdminCog(commands.Cog):
             await self._show_status(interaction)
 
     async def _show_status(self, interaction: discord.Interaction):
+        # Ack first: the ComfyUI probe can be slow when the server is down
+        await interaction.response.defer(ephemeral=True)
+
         comfy_status = await self.bot.comfy_client.check_status()
         status_emoji = "✅" if comfy_status else "❌"
         
@@ -29,7 +32,7 @@ class AdminCog(commands.Cog):
         embed.add_field(name="Guilds", value=str(len(self.bot.guilds)), inline=True)
         embed.add_field(name="Latency", value=f"{round(self.bot.latency * 1000)}ms", inline=True)
         
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
     @app_commands.command(name="setrole", description="Set permission level for a role")
     @require_permission(Permissions.ADMIN.value)
@@ -45,17 +48,22 @@ class AdminCog(commands.Cog):
             return
 
         try:
-            # Ensure server exists in DB
-            await self.bot.repository.get_or_create_server(
-                str(interaction.guild.id), 
-                interaction.guild.name
-            )
+            repository = self.bot.repository
+            async with repository.transaction() as session:
+                # Ensure server exists in DB
+                await repository.get_or_create_server(
+                    interaction.guild.id,
+                    interaction.guild.name,
+                    session=session,
+                )
 
-            await self.bot.repository.set_server_role(
-                server_discord_id=str(interaction.guild.id),
-                role_discord_id=str(role.id),
-                permission_level=level.value
-            )
+                await repository.set_server_role(
+                    server_discord_id=interaction.guild.id,
+                    role_discord_id=role.id,
+                    permission_level=level.value,
+                    session=session,
+                )
+            self.bot.permission_service.invalidate(interaction.guild.id)
             await interaction.response.send_message(
                 f"✅ Role {role.mention} set to **{level.name}** permission level.",
                 ephemeral=True
@@ -2,15 +2,46 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
-import json
+import os
+import threading
 from pathlib import Path
+from random import getrandbits
+from typing import Any, Dict, Tuple
 
+from .. import jsonutil
+from ._utils import spawn, persist_message_id
 from ..embeds.builders import EmbedBuilder
 from ..services.permissions import require_permission, Permissions
 from shared.workflow import WorkflowBuilder
 
 logger = logging.getLogger(__name__)
 
+# Parsed workflow cache: path -> ((st_mtime_ns, st_size, st_ino), workflow)
+_WORKFLOW_CACHE: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+_WORKFLOW_CACHE_LOCK = threading.Lock()
+
+
+def _load_workflow(path: Path) -> Dict[str, Any]:
+    """
+    Load a workflow JSON file, reusing the parsed result while the file is unchanged.
+
+    Returns a fresh copy, since WorkflowBuilder mutates the workflow in place.
+    """
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    with _WORKFLOW_CACHE_LOCK:
+        cached = _WORKFLOW_CACHE.get(path)
+        if cached is None or cached[0] != signature:
+            with open(path, "rb") as f:
+                workflow = jsonutil.loads(f.read())
+            _WORKFLOW_CACHE[path] = (signature, workflow)
+        else:
+            workflow = cached[1]
+
+    return jsonutil.clone(workflow)
+
+
 class GenerateCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -48,8 +79,7 @@ class GenerateCog(commands.Cog):
             return
 
         try:
-            with open(workflow_path, "r") as f:
-                workflow_json = json.load(f)
+            workflow_json = _load_workflow(workflow_path)
         except Exception as e:
             logger.error(f"Failed to load workflow: {e}")
             await interaction.followup.send("❌ Error: Failed to load workflow configuration.", ephemeral=True)
@@ -70,8 +100,7 @@ class GenerateCog(commands.Cog):
             builder.set_seed(seed)
         else:
             # Random seed if not provided
-            import random
-            generated_seed = random.randint(1, 1000000000000000)
+            generated_seed = getrandbits(50) or 1
             builder.set_seed(generated_seed)
             parameters["seed"] = generated_seed # Track actual seed
 
@@ -87,13 +116,13 @@ class GenerateCog(commands.Cog):
         delivery_method = delivery.value if delivery else "channel"
 
         # Check server context
-        server_id = str(interaction.guild_id) if interaction.guild else None
-        channel_id = str(interaction.channel_id)
+        server_id = interaction.guild_id if interaction.guild else None
+        channel_id = interaction.channel_id
 
         try:
             # Create Job
             job = await self.bot.job_manager.create_job(
-                user_discord_id=str(interaction.user.id),
+                user_discord_id=interaction.user.id,
                 workflow=final_workflow,
                 positive_prompt=prompt,
                 negative_prompt=negative_prompt,
@@ -109,8 +138,7 @@ class GenerateCog(commands.Cog):
             
             # Store the interaction message ID if we want to update it later
             # (JobManager could use this to update the specific message)
-            original_message = await interaction.original_response()
-            await self.bot.repository.update_job_message(job.prompt_id, str(original_message.id))
+            spawn(persist_message_id(self.bot, interaction, job.prompt_id))
 
         except Exception as e:
             logger.error(f"Failed to start generation: {e}")
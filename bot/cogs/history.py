@@ -4,10 +4,10 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
-import json
-import random
+from random import getrandbits
 from typing import List
 
+from ._utils import spawn, persist_message_id, truncate
 from ..services.permissions import require_permission, Permissions
 from ..database.models import JobStatus
 from ..embeds.builders import EmbedBuilder
@@ -15,6 +15,22 @@ from shared.workflow import WorkflowBuilder
 
 logger = logging.getLogger(__name__)
 
+class _StatusEmoji(dict):
+    """Status -> emoji table; unknown statuses render as ❓ without a .get() default."""
+
+    def __missing__(self, key):
+        return "❓"
+
+
+# Every JobStatus is populated, so lookups hit directly
+_STATUS_EMOJI = _StatusEmoji({
+    JobStatus.COMPLETED.value: "✅",
+    JobStatus.FAILED.value: "❌",
+    JobStatus.CANCELLED.value: "🚫",
+    JobStatus.PENDING.value: "⏳",
+    JobStatus.RUNNING.value: "🔄",
+})
+
 
 class HistoryPaginator(discord.ui.View):
     """Paginated view for job history."""
@@ -24,47 +40,37 @@ class HistoryPaginator(discord.ui.View):
         self.jobs = jobs
         self.per_page = per_page
         self.page = 0
-        self.max_page = (len(jobs) - 1) // per_page if jobs else 0
+        self._n = len(jobs)
+        # Slice once up front so page changes are a plain index lookup
+        self._pages = [jobs[i:i + per_page] for i in range(0, self._n, per_page)]
+        self.max_page = max(len(self._pages) - 1, 0)
         self._update_buttons()
 
     def _update_buttons(self):
         self.prev_button.disabled = self.page <= 0
         self.next_button.disabled = self.page >= self.max_page
 
+    @staticmethod
+    def _format_job(job) -> str:
+        """Render one history row."""
+        prompt_preview = truncate(job.positive_prompt or "No prompt", 50)
+
+        timestamp = (
+            job.created_at.strftime("%Y-%m-%d %H:%M") if job.created_at else "Unknown"
+        )
+
+        status_emoji = _STATUS_EMOJI[job.status]
+        return f"{status_emoji} **ID: {job.id}** | {timestamp}\n└ {prompt_preview}"
+
     def get_embed(self) -> discord.Embed:
         embed = discord.Embed(title="Generation History", color=discord.Color.blue())
 
-        start = self.page * self.per_page
-        end = start + self.per_page
-        page_jobs = self.jobs[start:end]
-
-        if not page_jobs:
+        if not 0 <= self.page < len(self._pages):
             embed.description = "No generation history found."
             return embed
 
-        lines = []
-        for job in page_jobs:
-            status_emoji = {
-                JobStatus.COMPLETED.value: "✅",
-                JobStatus.FAILED.value: "❌",
-                JobStatus.CANCELLED.value: "🚫",
-                JobStatus.PENDING.value: "⏳",
-                JobStatus.RUNNING.value: "🔄",
-            }.get(job.status, "❓")
-
-            prompt_preview = (job.positive_prompt or "No prompt")[:50]
-            if len(job.positive_prompt or "") > 50:
-                prompt_preview += "..."
-
-            timestamp = (
-                job.created_at.strftime("%Y-%m-%d %H:%M") if job.created_at else "Unknown"
-            )
-
-            lines.append(
-                f"{status_emoji} **ID: {job.id}** | {timestamp}\n└ {prompt_preview}"
-            )
-
-        embed.description = "\n\n".join(lines)
+        page_jobs = self._pages[self.page]
+        embed.description = "\n\n".join([self._format_job(job) for job in page_jobs])
         embed.set_footer(
             text=f"Page {self.page + 1}/{self.max_page + 1} | Use /rerun <id> to regenerate"
         )
@@ -103,7 +109,7 @@ class HistoryCog(commands.Cog):
         limit = min(max(1, limit), 50)  # Clamp between 1 and 50
 
         jobs = await self.bot.repository.list_user_jobs(
-            user_discord_id=str(interaction.user.id), limit=limit
+            user_discord_id=interaction.user.id, limit=limit
         )
 
         if not jobs:
@@ -123,7 +129,7 @@ class HistoryCog(commands.Cog):
         await interaction.response.defer()
 
         # Get the original job
-        original_job = await self.bot.repository.get_job_by_id(job_id)
+        original_job = await self.bot.repository.get_job_by_id(job_id, load_user=True)
 
         if not original_job:
             await interaction.followup.send(
@@ -132,37 +138,24 @@ class HistoryCog(commands.Cog):
             return
 
         # Check ownership
-        if str(original_job.user.discord_id) != str(interaction.user.id):
+        if original_job.user.discord_id != interaction.user.id:
             await interaction.followup.send(
                 "You can only rerun your own jobs.", ephemeral=True
             )
             return
 
-        # Check if job has required data
-        if not original_job.workflow_json:
+        # Check if job has required data (unparseable stored JSON loads as None)
+        workflow = await self.bot.repository.get_job_workflow(job_id)
+        if not workflow:
             await interaction.followup.send(
                 "This job cannot be rerun (workflow data not saved).", ephemeral=True
             )
             return
 
-        try:
-            workflow = json.loads(original_job.workflow_json)
-        except json.JSONDecodeError:
-            await interaction.followup.send(
-                "Failed to parse original workflow.", ephemeral=True
-            )
-            return
-
-        # Parse parameters
-        parameters = {}
-        if original_job.parameters:
-            try:
-                parameters = json.loads(original_job.parameters)
-            except json.JSONDecodeError:
-                pass
+        parameters = dict(original_job.parameters or {})
 
         # Generate new seed for rerun
-        new_seed = random.randint(1, 1000000000000000)
+        new_seed = getrandbits(50) or 1
         parameters["seed"] = new_seed
 
         # Update workflow with new seed
@@ -171,13 +164,13 @@ class HistoryCog(commands.Cog):
         final_workflow = builder.get_workflow()
 
         # Determine delivery and context
-        server_id = str(interaction.guild_id) if interaction.guild else None
-        channel_id = str(interaction.channel_id)
+        server_id = interaction.guild_id if interaction.guild else None
+        channel_id = interaction.channel_id
 
         try:
             # Create new job
             job = await self.bot.job_manager.create_job(
-                user_discord_id=str(interaction.user.id),
+                user_discord_id=interaction.user.id,
                 workflow=final_workflow,
                 positive_prompt=original_job.positive_prompt or "",
                 negative_prompt=original_job.negative_prompt or "",
@@ -193,10 +186,7 @@ class HistoryCog(commands.Cog):
             await interaction.followup.send(embed=embed)
 
             # Store message ID
-            original_message = await interaction.original_response()
-            await self.bot.repository.update_job_message(
-                job.prompt_id, str(original_message.id)
-            )
+            spawn(persist_message_id(self.bot, interaction, job.prompt_id))
 
         except Exception as e:
             logger.error(f"Failed to rerun job: {e}")
@@ -2,13 +2,21 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import logging
+from itertools import islice
 from typing import Optional
 
+from ._utils import truncate
 from ..services.permissions import require_permission, Permissions
 from ..database.models import JobStatus
 
 logger = logging.getLogger(__name__)
 
+# Covers every status the pending-jobs query can return
+_STATUS_EMOJI = {
+    JobStatus.PENDING.value: "⏳",
+    JobStatus.RUNNING.value: "🔄",
+}
+
 class QueueCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -44,12 +52,11 @@ class QueueCog(commands.Cog):
         
         # Show top 10
         desc_lines = []
-        for i, job in enumerate(pending_jobs[:10]):
-            status_icon = "🔄" if job.status == JobStatus.RUNNING.value else "⏳"
+        for i, job in enumerate(islice(pending_jobs, 10), start=1):
+            status_icon = _STATUS_EMOJI[job.status]
             user_mention = f"<@{job.user.discord_id}>"
-            prompt_text = job.positive_prompt or "No prompt provided"
-            prompt_preview = (prompt_text[:40] + "...") if len(prompt_text) > 40 else prompt_text
-            desc_lines.append(f"`#{i+1}` {status_icon} **ID:{job.id}** {user_mention}: {prompt_preview}")
+            prompt_preview = truncate(job.positive_prompt or "No prompt provided", 40)
+            desc_lines.append(f"`#{i}` {status_icon} **ID:{job.id}** {user_mention}: {prompt_preview}")
         
         if len(pending_jobs) > 10:
             desc_lines.append(f"...and {len(pending_jobs) - 10} more.")
@@ -68,16 +75,9 @@ class QueueCog(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         
         # Get user's pending jobs
-        # Note: repo.get_pending_jobs returns ALL. Better to filter or add new repo method.
-        # But for now let's iterate.
-        all_pending = await self.bot.repository.get_pending_jobs()
-        user_jobs = [j for j in all_pending if str(j.user.discord_id) == str(interaction.user.id)]
-        
-        count = 0
-        for job in user_jobs:
-            success = await self.bot.job_manager.cancel_job(job.id)
-            if success:
-                count += 1
+        user_jobs = await self.bot.repository.get_pending_jobs_for_user(interaction.user.id)
+
+        count = await self.bot.job_manager.cancel_jobs([job.id for job in user_jobs])
                 
         if count > 0:
             await interaction.followup.send(f"🗑️ Cancelled {count} of your pending jobs.", ephemeral=True)
@@ -92,13 +92,13 @@ class QueueCog(commands.Cog):
         """Cancel a specific job by ID."""
         await interaction.response.defer(ephemeral=True)
         
-        job = await self.bot.repository.get_job_by_id(job_id)
+        job = await self.bot.repository.get_job_by_id(job_id, load_user=True)
         if not job:
              await interaction.followup.send(f"❌ Job ID {job_id} not found.", ephemeral=True)
              return
 
         # Check permissions
-        is_owner = str(job.user.discord_id) == str(interaction.user.id)
+        is_owner = job.user.discord_id == interaction.user.id
         is_admin = await self.bot.permission_service.check_permission(interaction.user, Permissions.ADMIN.value)
         
         if not is_owner and not is_admin:
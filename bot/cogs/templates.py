@@ -3,19 +3,144 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
 import logging
-from typing import List
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 from ..services.permissions import require_permission, Permissions
 
 logger = logging.getLogger(__name__)
 
+# How long autocomplete reuses a user's template names before re-querying
+TEMPLATE_CACHE_TTL = 30.0
+# (user, server) pairs whose template names are kept; the least recently used is evicted
+TEMPLATE_CACHE_SIZE = 1024
+
+# (user_discord_id, server_discord_id)
+_CacheKey = Tuple[int, Optional[int]]
+
+# Discord's cap on autocomplete choices
+AUTOCOMPLETE_LIMIT = 25
+
+_Choices = List[app_commands.Choice[str]]
+
+# Templates shown per scope in /template list
+TEMPLATE_LIST_LIMIT = 10
+
+_EMBED_COLOR = discord.Color.blue()
+
+
+def _render_bucket(names: List[str], total: int) -> str:
+    """Render a bulleted template list with an overflow note for hidden entries."""
+    text = "\n".join(f"• {name}" for name in names)
+    if total > len(names):
+        text += f"\n...and {total - len(names)} more"
+    return text
+
 
 class TemplateCog(commands.Cog):
     """Manage prompt templates."""
 
     def __init__(self, bot):
         self.bot = bot
+        # key -> (loaded_at, {query: [Choice, ...]}), least recently used first
+        self._template_cache: OrderedDict[_CacheKey, Tuple[float, Dict[str, _Choices]]] = OrderedDict()
+        # One lock per key, so concurrent keystrokes share a single load; a lock
+        # is dropped only once no call is holding or waiting on it
+        self._template_locks: Dict[_CacheKey, asyncio.Lock] = {}
+        self._template_lock_users: Dict[_CacheKey, int] = {}
+
+    async def _template_choices(
+        self, user_id: int, server_id: Optional[int], query: str
+    ) -> _Choices:
+        """Get autocomplete choices matching query for a user, cached for TEMPLATE_CACHE_TTL."""
+        key = (user_id, server_id)
+        query = query.lower()
+        entry = self._template_cache.get(key)
+        if entry and time.monotonic() - entry[0] < TEMPLATE_CACHE_TTL:
+            self._template_cache.move_to_end(key)
+            choices = self._cached_choices(entry[1], query)
+            if choices is not None:
+                return choices
+        elif entry:
+            self._drop_templates(key)
+
+        lock = self._template_locks.setdefault(key, asyncio.Lock())
+        self._template_lock_users[key] = self._template_lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                # Another keystroke may have refreshed the entry while we waited
+                entry = self._template_cache.get(key)
+                if not entry or time.monotonic() - entry[0] >= TEMPLATE_CACHE_TTL:
+                    entry = (time.monotonic(), {})
+                    self._store_templates(key, entry)
+                else:
+                    choices = self._cached_choices(entry[1], query)
+                    if choices is not None:
+                        return choices
+
+                # If the entry is invalidated or evicted during the query, the
+                # result lands in the detached entry, never in the cache
+                names = await self.bot.repository.search_templates(
+                    user_discord_id=user_id,
+                    query=query,
+                    server_discord_id=server_id,
+                    limit=AUTOCOMPLETE_LIMIT,
+                )
+                choices = [app_commands.Choice(name=name, value=name) for name in names]
+                entry[1][query] = choices
+                return choices
+        finally:
+            self._template_lock_users[key] -= 1
+            # The entry was dropped while the lock was in use; drop the lock now
+            if key not in self._template_cache:
+                self._release_template_lock(key)
+
+    @staticmethod
+    def _cached_choices(by_query: Dict[str, _Choices], query: str) -> Optional[_Choices]:
+        """Serve a query from cache, filtering the unfiltered list when it is complete."""
+        choices = by_query.get(query)
+        if choices is not None:
+            return choices
+        everything = by_query.get("")
+        if everything is not None and len(everything) < AUTOCOMPLETE_LIMIT:
+            choices = [c for c in everything if query in c.name.lower()]
+            by_query[query] = choices
+            return choices
+        return None
+
+    def _store_templates(
+        self, key: _CacheKey, entry: Tuple[float, Dict[str, _Choices]]
+    ) -> None:
+        """Cache an entry as most recently used, evicting expired and overflow entries."""
+        self._template_cache[key] = entry
+        self._template_cache.move_to_end(key)
+
+        now = time.monotonic()
+        while self._template_cache:
+            oldest_key, (loaded_at, _) = next(iter(self._template_cache.items()))
+            expired = now - loaded_at >= TEMPLATE_CACHE_TTL
+            if not expired and len(self._template_cache) <= TEMPLATE_CACHE_SIZE:
+                break
+            self._drop_templates(oldest_key)
+
+    def _drop_templates(self, key: _CacheKey) -> None:
+        """Remove a cache entry, and its lock unless a load is using it."""
+        self._template_cache.pop(key, None)
+        self._release_template_lock(key)
+
+    def _release_template_lock(self, key: _CacheKey) -> None:
+        """Forget a key's lock once no call is holding or waiting on it."""
+        if not self._template_lock_users.get(key):
+            self._template_lock_users.pop(key, None)
+            self._template_locks.pop(key, None)
+
+    def _invalidate_templates(self, user_id: int, server_id: Optional[int]) -> None:
+        """Drop cached template names after the user saves or deletes a template."""
+        self._drop_templates((user_id, server_id))
+        self._drop_templates((user_id, None))
 
     template_group = app_commands.Group(
         name="template", description="Manage prompt templates"
@@ -47,42 +172,42 @@ class TemplateCog(commands.Cog):
             )
             return
 
-        # Ensure user exists
-        await self.bot.repository.get_or_create_user(
-            str(interaction.user.id), interaction.user.display_name
-        )
-
-        server_id = str(interaction.guild_id) if interaction.guild and shared else None
-        if server_id:
-            await self.bot.repository.get_or_create_server(
-                server_id, interaction.guild.name
-            )
+        server_id = interaction.guild_id if interaction.guild and shared else None
 
         try:
-            await self.bot.repository.create_template(
-                user_discord_id=str(interaction.user.id),
+            # User and server rows are ensured in the same transaction
+            template = await self.bot.repository.create_template(
+                user_discord_id=interaction.user.id,
                 name=name,
                 positive_prompt=prompt,
                 negative_prompt=negative_prompt,
                 server_discord_id=server_id,
+                username=interaction.user.display_name,
+                server_name=interaction.guild.name if server_id else None,
             )
+        except Exception as e:
+            logger.error(f"Failed to save template: {e}")
+            await interaction.followup.send(
+                "Failed to save template.", ephemeral=True
+            )
+            return
 
-            scope = "server" if shared else "private"
+        if template is None:
             await interaction.followup.send(
-                f"Saved template **{name}** ({scope}).", ephemeral=True
+                f"A template named **{name}** already exists. "
+                "Delete it first or use a different name.",
+                ephemeral=True,
             )
-        except Exception as e:
-            if "UNIQUE constraint" in str(e):
-                await interaction.followup.send(
-                    f"A template named **{name}** already exists. "
-                    "Delete it first or use a different name.",
-                    ephemeral=True,
-                )
-            else:
-                logger.error(f"Failed to save template: {e}")
-                await interaction.followup.send(
-                    "Failed to save template.", ephemeral=True
-                )
+            return
+
+        self._invalidate_templates(
+            interaction.user.id, interaction.guild_id if interaction.guild else None
+        )
+
+        scope = "server" if shared else "private"
+        await interaction.followup.send(
+            f"Saved template **{name}** ({scope}).", ephemeral=True
+        )
 
     @template_group.command(name="load", description="Load a saved template")
     @app_commands.describe(name="Template name to load")
@@ -90,29 +215,22 @@ class TemplateCog(commands.Cog):
         """Load a template and show its contents."""
         await interaction.response.defer(ephemeral=True)
 
-        server_id = str(interaction.guild_id) if interaction.guild else None
+        server_id = interaction.guild_id if interaction.guild else None
 
-        # Try user's private template first
-        template = await self.bot.repository.get_template(
-            user_discord_id=str(interaction.user.id), name=name
+        # User's private template first, then a shared server template
+        template = await self.bot.repository.get_template_for_context(
+            user_discord_id=interaction.user.id,
+            name=name,
+            server_discord_id=server_id,
         )
 
-        # Try shared server template if not found
-        if not template and server_id:
-            templates = await self.bot.repository.list_templates(
-                user_discord_id=str(interaction.user.id),
-                server_discord_id=server_id,
-                include_shared=True,
-            )
-            template = next((t for t in templates if t.name == name), None)
-
         if not template:
             await interaction.followup.send(
                 f"Template **{name}** not found.", ephemeral=True
             )
             return
 
-        embed = discord.Embed(title=f"Template: {template.name}", color=discord.Color.blue())
+        embed = discord.Embed(title=f"Template: {template.name}", color=_EMBED_COLOR)
         embed.add_field(
             name="Prompt", value=template.positive_prompt[:1024], inline=False
         )
@@ -133,10 +251,10 @@ class TemplateCog(commands.Cog):
         """List all available templates."""
         await interaction.response.defer(ephemeral=True)
 
-        server_id = str(interaction.guild_id) if interaction.guild else None
+        server_id = interaction.guild_id if interaction.guild else None
 
         templates = await self.bot.repository.list_templates(
-            user_discord_id=str(interaction.user.id),
+            user_discord_id=interaction.user.id,
             server_discord_id=server_id,
             include_shared=True,
         )
@@ -147,22 +265,35 @@ class TemplateCog(commands.Cog):
             )
             return
 
-        embed = discord.Embed(title="Your Templates", color=discord.Color.blue())
-
-        private_templates = [t for t in templates if t.server_id is None]
-        shared_templates = [t for t in templates if t.server_id is not None]
+        embed = discord.Embed(title="Your Templates", color=_EMBED_COLOR)
+
+        # Single pass: keep the first few names of each scope and count the rest
+        private_names: List[str] = []
+        shared_names: List[str] = []
+        private_total = shared_total = 0
+        for t in templates:
+            if t.server_id is None:
+                private_total += 1
+                if private_total <= TEMPLATE_LIST_LIMIT:
+                    private_names.append(t.name)
+            else:
+                shared_total += 1
+                if shared_total <= TEMPLATE_LIST_LIMIT:
+                    shared_names.append(t.name)
 
-        if private_templates:
-            names = "\n".join([f"• {t.name}" for t in private_templates[:10]])
-            if len(private_templates) > 10:
-                names += f"\n...and {len(private_templates) - 10} more"
-            embed.add_field(name="Private Templates", value=names, inline=False)
+        if private_names:
+            embed.add_field(
+                name="Private Templates",
+                value=_render_bucket(private_names, private_total),
+                inline=False,
+            )
 
-        if shared_templates:
-            names = "\n".join([f"• {t.name}" for t in shared_templates[:10]])
-            if len(shared_templates) > 10:
-                names += f"\n...and {len(shared_templates) - 10} more"
-            embed.add_field(name="Server Templates", value=names, inline=False)
+        if shared_names:
+            embed.add_field(
+                name="Server Templates",
+                value=_render_bucket(shared_names, shared_total),
+                inline=False,
+            )
 
         await interaction.followup.send(embed=embed, ephemeral=True)
 
@@ -173,20 +304,17 @@ class TemplateCog(commands.Cog):
         """Delete a template."""
         await interaction.response.defer(ephemeral=True)
 
-        # Try deleting private template
-        deleted = await self.bot.repository.delete_template(
-            user_discord_id=str(interaction.user.id), name=name
+        # Private template first, then the user's shared template in this server
+        deleted = await self.bot.repository.delete_template_for_context(
+            user_discord_id=interaction.user.id,
+            name=name,
+            server_discord_id=interaction.guild_id if interaction.guild else None,
         )
 
-        # Try deleting shared template if private not found
-        if not deleted and interaction.guild:
-            deleted = await self.bot.repository.delete_template(
-                user_discord_id=str(interaction.user.id),
-                name=name,
-                server_discord_id=str(interaction.guild_id),
-            )
-
         if deleted:
+            self._invalidate_templates(
+                interaction.user.id, interaction.guild_id if interaction.guild else None
+            )
             await interaction.followup.send(
                 f"Deleted template **{name}**.", ephemeral=True
             )
@@ -202,21 +330,9 @@ class TemplateCog(commands.Cog):
         self, interaction: discord.Interaction, current: str
     ) -> List[app_commands.Choice[str]]:
         """Autocomplete for template names."""
-        server_id = str(interaction.guild_id) if interaction.guild else None
-
-        templates = await self.bot.repository.list_templates(
-            user_discord_id=str(interaction.user.id),
-            server_discord_id=server_id,
-            include_shared=True,
-        )
-
-        # Filter by current input
-        filtered = [t for t in templates if current.lower() in t.name.lower()]
+        server_id = interaction.guild_id if interaction.guild else None
 
-        return [
-            app_commands.Choice(name=t.name, value=t.name)
-            for t in filtered[:25]  # Discord limit
-        ]
+        return await self._template_choices(interaction.user.id, server_id, current)
 
 
 async def setup(bot):
@@ -1,107 +1,176 @@
 import aiohttp
 import logging
-from typing import Optional, Dict, List, Any
-import json
+from typing import Optional, Dict, List, Any, BinaryIO
+import time
 import uuid
 
+from .. import jsonutil
+
 logger = logging.getLogger(__name__)
 
+# How long a check_status() result is reused before probing ComfyUI again
+STATUS_CACHE_TTL = 10.0
+
+# Connection pool settings for the REST session; ComfyUI is a single host,
+# so keep a small pool of long-lived keep-alive connections to it
+CONNECTOR_LIMIT = 64
+CONNECTOR_LIMIT_PER_HOST = 32
+KEEPALIVE_TIMEOUT = 75
+DNS_CACHE_TTL = 300
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=300, connect=5)
+
+# Read size when streaming image downloads
+IMAGE_CHUNK_SIZE = 64 * 1024
+
 class ComfyUIClient:
     """Async Client for interacting with ComfyUI REST API."""
 
+    __slots__ = ("base_url", "session", "_status_cached", "_status_ts")
+
     def __init__(self, base_url: str = "http://127.0.0.1:8188"):
         self.base_url = base_url.rstrip("/")
         self.session: Optional[aiohttp.ClientSession] = None
+        self._status_cached = False
+        self._status_ts: Optional[float] = None
 
-    async def _get_session(self) -> aiohttp.ClientSession:
+    def _get_session(self) -> aiohttp.ClientSession:
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTOR_LIMIT,
+                limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=REQUEST_TIMEOUT
+            )
         return self.session
 
+    def _request(self, method: str, path: str, **kwargs: Any):
+        """Start a request against the ComfyUI API; use as an async context manager."""
+        session = self.session
+        if session is None or session.closed:
+            session = self._get_session()
+        return session.request(method, f"{self.base_url}{path}", **kwargs)
+
     async def close(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
     async def check_status(self) -> bool:
-        """Check if ComfyUI server is reachable."""
+        """Check if ComfyUI server is reachable (cached for STATUS_CACHE_TTL seconds)."""
+        now = time.monotonic()
+        if self._status_ts is not None and now - self._status_ts < STATUS_CACHE_TTL:
+            return self._status_cached
+
         try:
-            session = await self._get_session()
-            async with session.get(f"{self.base_url}/system_stats") as response:
-                return response.status == 200
+            async with self._request("GET", "/system_stats") as response:
+                status = response.status == 200
         except Exception as e:
             logger.warning(f"Failed to connect to ComfyUI: {e}")
-            return False
+            status = False
+
+        self._status_cached = status
+        self._status_ts = time.monotonic()
+        return status
 
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics."""
-        session = await self._get_session()
-        async with session.get(f"{self.base_url}/system_stats") as response:
+        async with self._request("GET", "/system_stats") as response:
             response.raise_for_status()
-            return await response.json()
+            return await response.json(loads=jsonutil.loads)
 
     async def get_queue(self) -> Dict[str, Any]:
         """Get current queue status."""
-        session = await self._get_session()
-        async with session.get(f"{self.base_url}/queue") as response:
+        async with self._request("GET", "/queue") as response:
             response.raise_for_status()
-            return await response.json()
+            return await response.json(loads=jsonutil.loads)
 
     async def get_history(self, prompt_id: str) -> Dict[str, Any]:
         """Get history for a specific prompt ID."""
-        session = await self._get_session()
-        async with session.get(f"{self.base_url}/history/{prompt_id}") as response:
+        async with self._request("GET", f"/history/{prompt_id}") as response:
             response.raise_for_status()
-            return await response.json()
+            return await response.json(loads=jsonutil.loads)
 
-    async def queue_prompt(self, workflow: Dict[str, Any], client_id: str) -> Dict[str, Any]:
+    async def queue_prompt(self, workflow: Dict[str, Any], client_id: str, front: bool = False) -> Dict[str, Any]:
         """
         Queue a workflow for generation.
         
         Args:
             workflow: The workflow JSON object (API format)
             client_id: Unique client ID for WebSocket correlation
+            front: Insert at the front of ComfyUI's queue instead of the back
         """
-        session = await self._get_session()
         payload = {
             "prompt": workflow,
             "client_id": client_id
         }
-        async with session.post(f"{self.base_url}/prompt", json=payload) as response:
+        if front:
+            payload["front"] = True
+        async with self._request("POST", "/prompt", json=payload) as response:
             response.raise_for_status()
-            return await response.json()
+            return await response.json(loads=jsonutil.loads)
 
     async def interrupt(self):
         """Interrupt currently executing prompt."""
-        session = await self._get_session()
-        async with session.post(f"{self.base_url}/interrupt") as response:
-            try:
-                response.raise_for_status()
-            except Exception as e:
-                logger.error(f"Failed to interrupt: {e}")
-
-    async def delete_queue_item(self, prompt_id: str):
+        async with self._request("POST", "/interrupt") as response:
+            if response.status >= 400:
+                logger.error(f"Failed to interrupt: HTTP {response.status}")
+
+    async def delete_queue_item(self, prompt_id: str) -> bool:
         """Remove an item from queue."""
-        session = await self._get_session()
-        payload = {"delete": [prompt_id]}
-        async with session.post(f"{self.base_url}/queue", json=payload) as response:
-            response.raise_for_status()
+        return await self.delete_queue_items([prompt_id])
+
+    async def delete_queue_items(self, prompt_ids: List[str]) -> bool:
+        """
+        Remove several items from queue in one request.
+
+        Returns:
+            True if ComfyUI accepted the request
+        """
+        if not prompt_ids:
+            return True
+        payload = {"delete": list(prompt_ids)}
+        async with self._request("POST", "/queue", json=payload) as response:
+            if response.status >= 400:
+                logger.debug(f"Failed to delete queue items: HTTP {response.status}")
+                return False
+            return True
 
     async def get_image(self, filename: str, subfolder: str = "", type: str = "output") -> bytes:
         """Fetch a generated image."""
-        session = await self._get_session()
         params = {"filename": filename, "subfolder": subfolder, "type": type}
-        async with session.get(f"{self.base_url}/view", params=params) as response:
+        async with self._request("GET", "/view", params=params) as response:
             response.raise_for_status()
             return await response.read()
 
+    async def stream_image(
+        self, sink: BinaryIO, filename: str, subfolder: str = "", type: str = "output"
+    ) -> int:
+        """
+        Fetch a generated image into a file-like object in chunks.
+
+        Avoids holding a second full-size copy of the image while reading.
+
+        Returns:
+            Number of bytes written to sink
+        """
+        params = {"filename": filename, "subfolder": subfolder, "type": type}
+        written = 0
+        async with self._request("GET", "/view", params=params) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                sink.write(chunk)
+                written += len(chunk)
+        return written
+
     async def upload_image(self, image_data: bytes, filename: str, subfolder: str = ""):
         """Upload an image to ComfyUI (input folder)."""
-        session = await self._get_session()
         data = aiohttp.FormData()
         data.add_field("image", image_data, filename=filename)
         if subfolder:
             data.add_field("subfolder", subfolder)
             
-        async with session.post(f"{self.base_url}/upload/image", data=data) as response:
+        async with self._request("POST", "/upload/image", data=data) as response:
              response.raise_for_status()
-             return await response.json()
+             return await response.json(loads=jsonutil.loads)
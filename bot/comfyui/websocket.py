@@ -2,8 +2,11 @@ import aiohttp
 import logging
 import json
 import asyncio
+import math
 import random
-from typing import Callable, Coroutine, Any, Dict, List, Optional
+from typing import Callable, Coroutine, Any, Dict, List, Optional, Tuple
+
+from .. import jsonutil
 
 logger = logging.getLogger(__name__)
 
@@ -12,25 +15,52 @@ INITIAL_BACKOFF = 1.0       # Initial delay in seconds
 MAX_BACKOFF = 60.0          # Maximum delay cap
 BACKOFF_MULTIPLIER = 2      # Exponential multiplier
 JITTER_FACTOR = 0.1         # +/- 10% randomization
+# Exponent at which the backoff reaches MAX_BACKOFF; attempts beyond it are clamped
+MAX_BACKOFF_EXPONENT = math.ceil(math.log(MAX_BACKOFF / INITIAL_BACKOFF, BACKOFF_MULTIPLIER))
+
+# Progress events arrive once per sampler step; only the latest one per
+# prompt is dispatched, at most once per interval (seconds)
+PROGRESS_FLUSH_INTERVAL = 0.2
+
+EventHandler = Callable[[Dict[str, Any]], Coroutine[Any, Any, None]]
 
 class ComfyUIWebSocket:
     """WebSocket Client for real-time ComfyUI events."""
 
+    __slots__ = (
+        "ws_url",
+        "client_id",
+        "ws",
+        "session",
+        "_callbacks",
+        "_handlers",
+        "_running",
+        "_listen_task",
+        "_reconnect_attempts",
+        "_should_reconnect",
+        "_reconnect_task",
+        "_rng",
+        "_state_lock",
+        "_latest_progress",
+        "_progress_task",
+        "_dispatch_lock",
+    )
+
     def __init__(self, base_url: str = "ws://127.0.0.1:8188", client_id: str = ""):
         # Convert http/https to ws/wss if needed
-        if base_url.startswith("http://"):
-            base_url = base_url.replace("http://", "ws://")
-        elif base_url.startswith("https://"):
-            base_url = base_url.replace("https://", "wss://")
-            
-        self.ws_url = f"{base_url.rstrip('/')}/ws"
+        if base_url.startswith("http"):
+            base_url = "ws" + base_url[4:]
+
         self.client_id = client_id
+        self.ws_url = f"{base_url.rstrip('/')}/ws"
         if client_id:
-            self.ws_url += f"?clientId={client_id}"
+            self.ws_url = f"{self.ws_url}?clientId={client_id}"
             
         self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
         self.session: Optional[aiohttp.ClientSession] = None
-        self._callbacks: Dict[str, List[Callable[[Dict[str, Any]], Coroutine[Any, Any, None]]]] = {}
+        self._callbacks: Dict[str, List[EventHandler]] = {}
+        # Read-only view of _callbacks used on the hot path, rebuilt on registration
+        self._handlers: Dict[str, Tuple[EventHandler, ...]] = {}
         self._running = False
         self._listen_task: Optional[asyncio.Task] = None
 
@@ -38,10 +68,17 @@ class ComfyUIWebSocket:
         self._reconnect_attempts = 0
         self._should_reconnect = True
         self._reconnect_task: Optional[asyncio.Task] = None
+        self._rng = random.Random()
         
         # Lock to prevent race conditions between connect() and disconnect()
         self._state_lock = asyncio.Lock()
 
+        # Coalesced progress events: prompt_id -> latest event
+        self._latest_progress: Dict[Optional[str], Dict[str, Any]] = {}
+        self._progress_task: Optional[asyncio.Task] = None
+        # Keeps flushed progress ordered with the events that follow it
+        self._dispatch_lock = asyncio.Lock()
+
     async def connect(self) -> bool:
         """Connect to the WebSocket.
         
@@ -92,6 +129,10 @@ class ComfyUIWebSocket:
             except asyncio.CancelledError:
                 pass
 
+        if self._progress_task and not self._progress_task.done():
+            self._progress_task.cancel()
+        self._latest_progress.clear()
+
         if self.ws:
             await self.ws.close()
         if self.session:
@@ -102,36 +143,97 @@ class ComfyUIWebSocket:
             except asyncio.CancelledError:
                 pass
 
-    def add_listener(self, event_type: str, callback: Callable[[Dict[str, Any]], Coroutine[Any, Any, None]]):
+    def add_listener(self, event_type: str, callback: EventHandler):
         """Register a callback for an event type."""
         if event_type not in self._callbacks:
             self._callbacks[event_type] = []
         self._callbacks[event_type].append(callback)
+        self._handlers[event_type] = tuple(self._callbacks[event_type])
+
+    async def _dispatch(
+        self,
+        event_type: str,
+        handlers: Tuple[EventHandler, ...],
+        data: Dict[str, Any],
+    ) -> None:
+        """Run all handlers for one event concurrently, isolating their errors."""
+        if len(handlers) == 1:
+            try:
+                await handlers[0](data)
+            except Exception as e:
+                logger.error(f"Error in WebSocket handler for {event_type}: {e}")
+            return
+
+        results = await asyncio.gather(
+            *(handler(data) for handler in handlers), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error in WebSocket handler for {event_type}: {result}")
+
+    def _queue_progress(self, data: Dict[str, Any]) -> None:
+        """Keep only the latest progress event per prompt until the next flush."""
+        prompt_id = (data.get("data") or {}).get("prompt_id")
+        self._latest_progress[prompt_id] = data
+        if self._progress_task is None or self._progress_task.done():
+            self._progress_task = asyncio.create_task(self._flush_progress_later())
+
+    async def _flush_progress_later(self) -> None:
+        await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+        async with self._dispatch_lock:
+            await self._flush_progress()
+        # _progress_task referenced this task until now; events queued while
+        # the handlers ran get the next flush
+        self._progress_task = None
+        if self._latest_progress:
+            self._progress_task = asyncio.create_task(self._flush_progress_later())
+
+    async def _flush_progress(self) -> None:
+        """Dispatch pending progress events. Caller must hold _dispatch_lock."""
+        if not self._latest_progress:
+            return
+        pending = list(self._latest_progress.values())
+        self._latest_progress.clear()
+        handlers = self._handlers.get("progress")
+        if handlers:
+            for data in pending:
+                await self._dispatch("progress", handlers, data)
 
     async def _listen(self):
         """Listen loop for incoming messages."""
         if not self.ws:
             return
 
+        text_type = aiohttp.WSMsgType.TEXT
+        error_type = aiohttp.WSMsgType.ERROR
+
         try:
             async for msg in self.ws:
-                if msg.type == aiohttp.WSMsgType.TEXT:
+                if msg.type == text_type:
                     try:
-                        data = json.loads(msg.data)
-                        event_type = data.get("type", "unknown")
-                        # Some messages pack content in 'data', others at top level
-                        # ComfyUI typically sends {type: "event_name", data: {...}, sid: "..."}
-                        
-                        handlers = self._callbacks.get(event_type, [])
-                        for handler in handlers:
-                            try:
-                                await handler(data)
-                            except Exception as e:
-                                logger.error(f"Error in WebSocket handler for {event_type}: {e}")
-                                
+                        data = jsonutil.loads(msg.data)
                     except json.JSONDecodeError:
                         logger.warning(f"Received invalid JSON: {msg.data}")
-                elif msg.type == aiohttp.WSMsgType.ERROR:
+                        continue
+                    if not isinstance(data, dict):
+                        continue
+
+                    # ComfyUI typically sends {type: "event_name", data: {...}, sid: "..."}
+                    event_type = data.get("type", "unknown")
+                    if event_type == "progress":
+                        self._queue_progress(data)
+                        continue
+
+                    handlers = self._handlers.get(event_type)
+                    if not handlers and not self._latest_progress:
+                        continue
+
+                    async with self._dispatch_lock:
+                        # Deliver pending progress before anything that follows it
+                        await self._flush_progress()
+                        if handlers:
+                            await self._dispatch(event_type, handlers, data)
+                elif msg.type == error_type:
                     logger.error("WebSocket connection closed with error")
                     break
         except Exception as e:
@@ -144,10 +246,11 @@ class ComfyUIWebSocket:
 
     def _calculate_backoff(self) -> float:
         """Calculate backoff delay with exponential growth and jitter."""
-        delay = INITIAL_BACKOFF * (BACKOFF_MULTIPLIER ** self._reconnect_attempts)
+        exponent = min(self._reconnect_attempts, MAX_BACKOFF_EXPONENT)
+        delay = INITIAL_BACKOFF * (BACKOFF_MULTIPLIER ** exponent)
         delay = min(delay, MAX_BACKOFF)
         # Add jitter: +/- JITTER_FACTOR
-        jitter = delay * JITTER_FACTOR * (2 * random.random() - 1)
+        jitter = delay * JITTER_FACTOR * (2 * self._rng.random() - 1)
         return delay + jitter
 
     async def _handle_disconnect(self) -> None:
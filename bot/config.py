@@ -8,21 +8,46 @@ Configuration is loaded from (in priority order):
 """
 
 import os
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from pathlib import Path
 from typing import Optional
 
-import yaml
+# PyYAML is imported on first use so env-only deployments never load it
+_yaml_loader = None
 
 
-@dataclass
+def _load_yaml(data: bytes):
+    """Parse YAML with the libyaml-backed loader if available, pure-Python otherwise."""
+    global _yaml_loader
+    import yaml
+
+    if _yaml_loader is None:
+        _yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(data, Loader=_yaml_loader)
+
+
+# Default database URL, built (and its directory created) on first use
+_default_db_url: Optional[str] = None
+
+
+def _default_database_url() -> str:
+    """SQLite database in the bot/data directory, created once per process."""
+    global _default_db_url
+    if _default_db_url is None:
+        data_dir = Path(__file__).parent / "data"
+        data_dir.mkdir(exist_ok=True)
+        _default_db_url = f"sqlite+aiosqlite:///{data_dir}/bot.db"
+    return _default_db_url
+
+
+@dataclass(frozen=True, slots=True)
 class DiscordConfig:
     """Discord-related configuration."""
     token: str = ""
     application_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ComfyUIConfig:
     """ComfyUI connection configuration."""
     url: str = "http://127.0.0.1:8188"
@@ -30,7 +55,7 @@ class ComfyUIConfig:
     timeout: int = 30
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DefaultsConfig:
     """Default values for bot operations."""
     max_queue_per_user: int = 3
@@ -42,27 +67,53 @@ class DefaultsConfig:
     default_height: int = 512
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DatabaseConfig:
     """Database configuration."""
     url: str = ""
 
     def __post_init__(self):
         if not self.url:
-            # Default to SQLite in bot/data directory
-            bot_dir = Path(__file__).parent
-            data_dir = bot_dir / "data"
-            data_dir.mkdir(exist_ok=True)
-            self.url = f"sqlite+aiosqlite:///{data_dir}/bot.db"
+            object.__setattr__(self, "url", _default_database_url())
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SecurityConfig:
     """Security configuration."""
-    allowed_guilds: list[int] = field(default_factory=list)
-
-
-@dataclass
+    # Guild IDs the bot may operate in; empty means no restriction
+    allowed_guilds: frozenset[int] = frozenset()
+
+
+# config.yaml section -> dataclass holding that section
+_SECTIONS = {
+    "discord": DiscordConfig,
+    "comfyui": ComfyUIConfig,
+    "defaults": DefaultsConfig,
+    "database": DatabaseConfig,
+    "security": SecurityConfig,
+}
+
+# config.yaml section -> keys it may set (the fields of that section's dataclass)
+_FILE_SCHEMA = {
+    section: frozenset(f.name for f in fields(cls))
+    for section, cls in _SECTIONS.items()
+}
+
+
+# Environment variable -> (section, field, converter)
+_ENV_SCHEMA = {
+    "DISCORDBOT_DISCORD_TOKEN": ("discord", "token", str),
+    "DISCORDBOT_APPLICATION_ID": ("discord", "application_id", str),
+    "DISCORDBOT_COMFYUI_URL": ("comfyui", "url", str),
+    "DISCORDBOT_COMFYUI_WS_URL": ("comfyui", "ws_url", str),
+    "DISCORDBOT_COMFYUI_TIMEOUT": ("comfyui", "timeout", int),
+    "DISCORDBOT_DATABASE_URL": ("database", "url", str),
+    "DISCORDBOT_MAX_QUEUE_PER_USER": ("defaults", "max_queue_per_user", int),
+    "DISCORDBOT_WORKFLOW_PATH": ("defaults", "workflow_path", str),
+}
+
+
+@dataclass(frozen=True, slots=True)
 class BotConfig:
     """Main bot configuration container."""
     discord: DiscordConfig = field(default_factory=DiscordConfig)
@@ -82,98 +133,24 @@ class BotConfig:
         Returns:
             Loaded BotConfig instance
         """
-        config = cls()
+        # Configs are frozen, so gather every section's settings first and
+        # build each section exactly once
+        settings = {section: {} for section in _SECTIONS}
 
         # Load from config file if exists
         if config_path is None:
-            config_path = Path(__file__).parent / "config.yaml"
+            config_path = _default_config_path()
 
         if config_path.exists():
-            config._load_from_file(config_path)
+            _read_file(config_path, settings)
 
         # Override with environment variables
-        config._load_from_env()
-
-        return config
-
-    def _load_from_file(self, path: Path) -> None:
-        """Load configuration from YAML file."""
-        with open(path) as f:
-            data = yaml.safe_load(f) or {}
-
-        # Discord config
-        if "discord" in data:
-            discord_data = data["discord"]
-            if "token" in discord_data:
-                self.discord.token = discord_data["token"]
-            if "application_id" in discord_data:
-                self.discord.application_id = discord_data["application_id"]
-
-        # ComfyUI config
-        if "comfyui" in data:
-            comfyui_data = data["comfyui"]
-            if "url" in comfyui_data:
-                self.comfyui.url = comfyui_data["url"]
-            if "ws_url" in comfyui_data:
-                self.comfyui.ws_url = comfyui_data["ws_url"]
-            if "timeout" in comfyui_data:
-                self.comfyui.timeout = comfyui_data["timeout"]
-
-        # Defaults config
-        if "defaults" in data:
-            defaults_data = data["defaults"]
-            if "max_queue_per_user" in defaults_data:
-                self.defaults.max_queue_per_user = defaults_data["max_queue_per_user"]
-            if "progress_update_interval" in defaults_data:
-                self.defaults.progress_update_interval = defaults_data["progress_update_interval"]
-            if "workflow_path" in defaults_data:
-                self.defaults.workflow_path = defaults_data["workflow_path"]
-            if "default_steps" in defaults_data:
-                self.defaults.default_steps = defaults_data["default_steps"]
-            if "default_cfg" in defaults_data:
-                self.defaults.default_cfg = defaults_data["default_cfg"]
-            if "default_width" in defaults_data:
-                self.defaults.default_width = defaults_data["default_width"]
-            if "default_height" in defaults_data:
-                self.defaults.default_height = defaults_data["default_height"]
-
-        # Database config
-        if "database" in data:
-            db_data = data["database"]
-            if "url" in db_data:
-                self.database.url = db_data["url"]
-
-        # Security config
-        if "security" in data:
-            security_data = data["security"]
-            if "allowed_guilds" in security_data:
-                self.security.allowed_guilds = security_data["allowed_guilds"] or []
-
-    def _load_from_env(self) -> None:
-        """Load configuration from environment variables."""
-        # Discord
-        if token := os.getenv("DISCORDBOT_DISCORD_TOKEN"):
-            self.discord.token = token
-        if app_id := os.getenv("DISCORDBOT_APPLICATION_ID"):
-            self.discord.application_id = app_id
-
-        # ComfyUI
-        if url := os.getenv("DISCORDBOT_COMFYUI_URL"):
-            self.comfyui.url = url
-        if ws_url := os.getenv("DISCORDBOT_COMFYUI_WS_URL"):
-            self.comfyui.ws_url = ws_url
-        if timeout := os.getenv("DISCORDBOT_COMFYUI_TIMEOUT"):
-            self.comfyui.timeout = int(timeout)
-
-        # Database
-        if db_url := os.getenv("DISCORDBOT_DATABASE_URL"):
-            self.database.url = db_url
-
-        # Defaults
-        if max_queue := os.getenv("DISCORDBOT_MAX_QUEUE_PER_USER"):
-            self.defaults.max_queue_per_user = int(max_queue)
-        if workflow := os.getenv("DISCORDBOT_WORKFLOW_PATH"):
-            self.defaults.workflow_path = workflow
+        _read_env(settings)
+
+        return cls(**{
+            section: _SECTIONS[section](**values)
+            for section, values in settings.items()
+        })
 
     def validate(self) -> list[str]:
         """
@@ -193,20 +170,82 @@ class BotConfig:
         return errors
 
 
+def _read_file(path: Path, settings: dict) -> None:
+    """Collect settings from a YAML config file into settings[section]."""
+    # Hand the loader raw bytes; it detects the encoding and decodes in C
+    data = _load_yaml(path.read_bytes()) or {}
+
+    for section, keys in _FILE_SCHEMA.items():
+        section_data = data.get(section)
+        if not section_data:
+            continue
+        target = settings[section]
+        for key, value in section_data.items():
+            if key in keys:
+                target[key] = value
+
+    # Stored as a frozenset for O(1) membership checks; an empty
+    # "allowed_guilds:" entry means no restriction
+    security = settings["security"]
+    if "allowed_guilds" in security:
+        security["allowed_guilds"] = frozenset(security["allowed_guilds"] or ())
+
+
+def _read_env(settings: dict) -> None:
+    """Collect settings from environment variables into settings[section]."""
+    environ = os.environ
+    for name, (section, key, convert) in _ENV_SCHEMA.items():
+        # Unset and empty variables leave the file/default value alone
+        if value := environ.get(name):
+            settings[section][key] = convert(value)
+
+
 # Global config instance (lazy loaded)
 _config: Optional[BotConfig] = None
+# Sources _config was built from, see _config_fingerprint()
+_config_key: Optional[tuple] = None
+
+
+def _default_config_path() -> Path:
+    return Path(__file__).parent / "config.yaml"
+
+
+def _config_fingerprint(config_path: Path) -> tuple:
+    """Identify the config sources: file path + mtime and DISCORDBOT_* variables."""
+    try:
+        mtime = config_path.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    env = tuple(
+        sorted((k, v) for k, v in os.environ.items() if k.startswith("DISCORDBOT_"))
+    )
+    return (str(config_path), mtime, env)
 
 
 def get_config() -> BotConfig:
     """Get the global configuration instance."""
-    global _config
+    global _config, _config_key
     if _config is None:
-        _config = BotConfig.load()
+        config_path = _default_config_path()
+        _config_key = _config_fingerprint(config_path)
+        _config = BotConfig.load(config_path)
     return _config
 
 
-def reload_config(config_path: Optional[Path] = None) -> BotConfig:
-    """Reload configuration from disk."""
-    global _config
+def reload_config(config_path: Optional[Path] = None, force: bool = False) -> BotConfig:
+    """
+    Reload configuration from disk.
+
+    Returns the current instance unchanged if neither the config file nor the
+    DISCORDBOT_* environment variables changed since it was loaded, unless
+    force is set.
+    """
+    global _config, _config_key
+    if config_path is None:
+        config_path = _default_config_path()
+    key = _config_fingerprint(config_path)
+    if _config is not None and key == _config_key and not force:
+        return _config
     _config = BotConfig.load(config_path)
+    _config_key = key
     return _config
@@ -1,6 +1,6 @@
 """Database package for bot persistence."""
 
-from .models import Base, User, Server, ServerRole, Template, Job, Workflow
+from .models import Base, User, Server, ServerRole, Template, Job, JobPayload, Workflow
 from .repository import Repository
 
 __all__ = [
@@ -10,6 +10,7 @@ __all__ = [
     "ServerRole",
     "Template",
     "Job",
+    "JobPayload",
     "Workflow",
     "Repository",
 ]
@@ -7,40 +7,176 @@ Tables:
 - server_roles: Permission role mappings
 - templates: Saved prompt presets
 - jobs: Generation history and queue
+- job_payloads: Workflow JSON submitted for each job
 - workflows: Default workflow storage
 """
 
+import uuid
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
-    Column,
     DateTime,
+    Enum as SQLEnum,
     Float,
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     String,
     Text,
+    TypeDecorator,
     UniqueConstraint,
+    func,
+    text,
 )
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+
+from .. import jsonutil
+
+
+class Snowflake(TypeDecorator):
+    """
+    Discord snowflake ID stored as a 64-bit integer.
+
+    Databases created before IDs were stored as integers hold them as text;
+    those values are coerced back to int on read.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return int(value) if value is not None else None
+
+
+class PromptId(TypeDecorator):
+    """
+    ComfyUI prompt ID stored as the 16 raw bytes of its UUID.
+
+    Only canonical UUID strings (lowercase, dashed) are packed, so every ID
+    reads back exactly as written. Anything else is stored as its UTF-8 bytes
+    followed by 0xFF padding (a byte UTF-8 never contains), using two pad
+    bytes where one would make it 16 bytes long, so it can never be mistaken
+    for a packed UUID. Databases created before this encoding hold the IDs as
+    text; init_db re-encodes those rows, and until then they read back unchanged.
+    """
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    _TEXT_PAD = b"\xff"
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            packed = uuid.UUID(value)
+        except ValueError:
+            packed = None
+        if packed is not None and str(packed) == value:
+            return packed.bytes
+        encoded = value.encode() + self._TEXT_PAD
+        if len(encoded) == 16:
+            encoded += self._TEXT_PAD
+        return encoded
+
+    def result_processor(self, dialect, coltype):
+        # Bypass LargeBinary's bytes() coercion, which rejects legacy text rows
+        process = self.process_result_value
+        return lambda value: process(value, dialect)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if len(value) == 16:
+            return str(uuid.UUID(bytes=value))
+        # Unpadded values are non-UUID IDs written before padding was added
+        return value.rstrip(self._TEXT_PAD).decode()
+
+
+class JSONText(TypeDecorator):
+    """
+    JSON document stored as text, or as native JSONB on PostgreSQL.
+
+    Values are (de)serialized with the bot's JSON helpers on the way in and
+    out, so callers work with dicts/lists directly; on PostgreSQL the driver
+    does this instead. Stored text that does not parse reads back as None.
+    Assign a new object to persist changes; in-place mutation is not tracked.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import JSONB
+
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return jsonutil.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        try:
+            return jsonutil.loads(value)
+        except ValueError:
+            return None
 
 
 class Base(DeclarativeBase):
-    """Base class for all models."""
-    pass
+    """
+    Base class for all models.
+
+    Timestamps default to the database's CURRENT_TIMESTAMP, rendered inline
+    in the INSERT/UPDATE; eager_defaults reads them back in the same
+    statement (RETURNING) so they are loaded on the returned objects.
+    """
+    __mapper_args__ = {"eager_defaults": True}
+
+
+class _ValueEnum(str, Enum):
+    """
+    String enum whose members behave exactly like their values.
+
+    Members hash, print and format as the plain string, so they can be used
+    interchangeably with the raw values as dict keys, in f-strings and in
+    comparisons.
+    """
+    __hash__ = str.__hash__
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+def _enum_column(enum_cls: type, length: int) -> SQLEnum:
+    """
+    VARCHAR column type validated against an enum's values.
+
+    The enum's values (not member names) are what is stored, so rows written
+    when these were plain String columns read back unchanged.
+    """
+    return SQLEnum(
+        enum_cls,
+        native_enum=False,
+        length=length,
+        values_callable=lambda cls: [member.value for member in cls],
+        validate_strings=True,
+    )
 
 
-class DeliveryType(str, Enum):
+class DeliveryType(_ValueEnum):
     """Delivery method for generated images."""
     CHANNEL = "channel"
     DM = "dm"
 
 
-class JobStatus(str, Enum):
+class JobStatus(_ValueEnum):
     """Status of a generation job."""
     PENDING = "pending"
     RUNNING = "running"
@@ -49,7 +185,15 @@ class JobStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
-class PermissionLevel(str, Enum):
+# Jobs still queued or executing in ComfyUI
+ACTIVE_JOB_STATUSES = (JobStatus.PENDING.value, JobStatus.RUNNING.value)
+# Jobs that have finished and will not change status again
+FINISHED_JOB_STATUSES = frozenset(
+    (JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value)
+)
+
+
+class PermissionLevel(_ValueEnum):
     """Permission levels for role-based access."""
     USER = "user"
     GENERATOR = "generator"
@@ -60,18 +204,28 @@ class User(Base):
     """Discord user preferences and data."""
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    discord_id = Column(String(20), unique=True, nullable=False, index=True)
-    username = Column(String(100), nullable=False)
-    default_delivery = Column(String(10), default=DeliveryType.CHANNEL.value)
-    default_workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    discord_id: Mapped[int] = mapped_column(Snowflake, unique=True, index=True)
+    username: Mapped[str] = mapped_column(String(100))
+    default_delivery: Mapped[Optional[DeliveryType]] = mapped_column(
+        _enum_column(DeliveryType, 10), default=DeliveryType.CHANNEL
+    )
+    default_workflow_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("workflows.id")
+    )
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now()
+    )
 
     # Relationships
-    templates = relationship("Template", back_populates="user", cascade="all, delete-orphan")
-    jobs = relationship("Job", back_populates="user", cascade="all, delete-orphan")
-    default_workflow = relationship("Workflow", foreign_keys=[default_workflow_id])
+    templates: Mapped[List["Template"]] = relationship(
+        back_populates="user", cascade="all, delete-orphan"
+    )
+    jobs: Mapped[List["Job"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    default_workflow: Mapped[Optional["Workflow"]] = relationship(
+        foreign_keys=[default_workflow_id]
+    )
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, discord_id={self.discord_id}, username={self.username})>"
@@ -81,42 +235,55 @@ class Server(Base):
     """Discord server (guild) configuration."""
     __tablename__ = "servers"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    discord_id = Column(String(20), unique=True, nullable=False, index=True)
-    name = Column(String(100), nullable=False)
-    default_channel_id = Column(String(20), nullable=True)
-    enabled = Column(Boolean, default=True)
-    max_queue_per_user = Column(Integer, default=3)
-    default_workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    discord_id: Mapped[int] = mapped_column(Snowflake, unique=True, index=True)
+    name: Mapped[str] = mapped_column(String(100))
+    default_channel_id: Mapped[Optional[int]] = mapped_column(Snowflake)
+    enabled: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    max_queue_per_user: Mapped[Optional[int]] = mapped_column(Integer, default=3)
+    default_workflow_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("workflows.id")
+    )
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now()
+    )
 
     # Relationships
-    roles = relationship("ServerRole", back_populates="server", cascade="all, delete-orphan")
-    templates = relationship("Template", back_populates="server", cascade="all, delete-orphan")
-    jobs = relationship("Job", back_populates="server")
-    default_workflow = relationship("Workflow", foreign_keys=[default_workflow_id])
+    roles: Mapped[List["ServerRole"]] = relationship(
+        back_populates="server", cascade="all, delete-orphan"
+    )
+    templates: Mapped[List["Template"]] = relationship(
+        back_populates="server", cascade="all, delete-orphan"
+    )
+    jobs: Mapped[List["Job"]] = relationship(back_populates="server")
+    default_workflow: Mapped[Optional["Workflow"]] = relationship(
+        foreign_keys=[default_workflow_id]
+    )
 
     def __repr__(self) -> str:
         return f"<Server(id={self.id}, discord_id={self.discord_id}, name={self.name})>"
 
 
 class ServerRole(Base):
-    """Role-based permission mapping for servers."""
+    """
+    Role-based permission mapping for servers.
+
+    Keyed by (server_id, role_discord_id) and stored WITHOUT ROWID on SQLite,
+    so the primary key index is the table itself.
+    """
     __tablename__ = "server_roles"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    server_id = Column(Integer, ForeignKey("servers.id"), nullable=False)
-    role_discord_id = Column(String(20), nullable=False)
-    permission_level = Column(String(20), nullable=False)
+    server_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("servers.id"), primary_key=True, autoincrement=False
+    )
+    role_discord_id: Mapped[int] = mapped_column(Snowflake, primary_key=True)
+    permission_level: Mapped[PermissionLevel] = mapped_column(_enum_column(PermissionLevel, 20))
 
     # Relationships
-    server = relationship("Server", back_populates="roles")
+    server: Mapped["Server"] = relationship(back_populates="roles")
 
-    __table_args__ = (
-        UniqueConstraint("server_id", "role_discord_id", name="uq_server_role"),
-        Index("idx_server_roles_server", "server_id"),
-    )
+    __table_args__ = {"sqlite_with_rowid": False}
 
     def __repr__(self) -> str:
         return f"<ServerRole(server_id={self.server_id}, role={self.role_discord_id}, level={self.permission_level})>"
@@ -126,13 +293,27 @@ class Workflow(Base):
     """Stored workflow configurations."""
     __tablename__ = "workflows"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
-    description = Column(Text, nullable=True)
-    workflow_json = Column(Text, nullable=False)
-    is_default = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(100))
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    workflow_json: Mapped[str] = mapped_column(Text)
+    is_default: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now()
+    )
+
+    __table_args__ = (
+        # Holds only the default row: enforces a single default and lets the
+        # default lookup and the unset in save_workflow seek straight to it
+        Index(
+            "uq_workflows_default",
+            "is_default",
+            unique=True,
+            sqlite_where=text("is_default = 1"),
+            postgresql_where=text("is_default"),
+        ),
+    )
 
     def __repr__(self) -> str:
         return f"<Workflow(id={self.id}, name={self.name}, is_default={self.is_default})>"
@@ -142,23 +323,26 @@ class Template(Base):
     """User-saved prompt templates."""
     __tablename__ = "templates"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    server_id = Column(Integer, ForeignKey("servers.id"), nullable=True)  # NULL = private
-    name = Column(String(100), nullable=False)
-    positive_prompt = Column(Text, nullable=False)
-    negative_prompt = Column(Text, default="")
-    parameters = Column(Text, nullable=True)  # JSON: {steps, cfg, seed, etc.}
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    server_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("servers.id"))  # NULL = private
+    name: Mapped[str] = mapped_column(String(100))
+    positive_prompt: Mapped[str] = mapped_column(Text)
+    negative_prompt: Mapped[Optional[str]] = mapped_column(Text, default="")
+    parameters: Mapped[Optional[dict]] = mapped_column(JSONText)  # {steps, cfg, seed, etc.}
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now()
+    )
 
     # Relationships
-    user = relationship("User", back_populates="templates")
-    server = relationship("Server", back_populates="templates")
+    user: Mapped["User"] = relationship(back_populates="templates")
+    server: Mapped[Optional["Server"]] = relationship(back_populates="templates")
 
     __table_args__ = (
         Index("idx_templates_user", "user_id"),
         Index("idx_templates_server", "server_id"),
+        Index("idx_templates_lookup", "name", "user_id", "server_id"),
         UniqueConstraint("user_id", "server_id", "name", name="uq_template_name"),
     )
 
@@ -170,43 +354,55 @@ class Job(Base):
     """Generation job tracking and history."""
     __tablename__ = "jobs"
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    prompt_id = Column(String(64), unique=True, nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    server_id = Column(Integer, ForeignKey("servers.id"), nullable=True)
-    channel_id = Column(String(20), nullable=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    prompt_id: Mapped[str] = mapped_column(PromptId, unique=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    server_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("servers.id"))
+    channel_id: Mapped[Optional[int]] = mapped_column(Snowflake)
 
     # Status tracking
-    status = Column(String(20), default=JobStatus.PENDING.value, index=True)
-    queue_position = Column(Integer, nullable=True)
-    progress = Column(Integer, default=0)
-    progress_max = Column(Integer, default=0)
+    status: Mapped[Optional[JobStatus]] = mapped_column(
+        _enum_column(JobStatus, 20), default=JobStatus.PENDING
+    )
+    queue_position: Mapped[Optional[int]] = mapped_column(Integer)
+    progress: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    progress_max: Mapped[Optional[int]] = mapped_column(Integer, default=0)
 
     # Generation parameters
-    positive_prompt = Column(Text, nullable=True)
-    negative_prompt = Column(Text, nullable=True)
-    parameters = Column(Text, nullable=True)  # JSON
-    workflow_json = Column(Text, nullable=True)
+    positive_prompt: Mapped[Optional[str]] = mapped_column(Text)
+    negative_prompt: Mapped[Optional[str]] = mapped_column(Text)
+    parameters: Mapped[Optional[dict]] = mapped_column(JSONText)
 
     # Results
-    output_images = Column(Text, nullable=True)  # JSON array
-    error_message = Column(Text, nullable=True)
+    output_images: Mapped[Optional[list]] = mapped_column(JSONText)  # [{filename, subfolder, type}]
+    error_message: Mapped[Optional[str]] = mapped_column(Text)
 
     # Delivery
-    delivery_type = Column(String(10), default=DeliveryType.CHANNEL.value)
-    message_id = Column(String(20), nullable=True)  # Discord message for updates
+    delivery_type: Mapped[Optional[DeliveryType]] = mapped_column(
+        _enum_column(DeliveryType, 10), default=DeliveryType.CHANNEL
+    )
+    message_id: Mapped[Optional[int]] = mapped_column(Snowflake)  # Discord message for updates
 
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
-    started_at = Column(DateTime, nullable=True)
-    completed_at = Column(DateTime, nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
 
     # Relationships
-    user = relationship("User", back_populates="jobs")
-    server = relationship("Server", back_populates="jobs")
+    user: Mapped["User"] = relationship(back_populates="jobs")
+    server: Mapped[Optional["Server"]] = relationship(back_populates="jobs")
+    payload: Mapped[Optional["JobPayload"]] = relationship(
+        back_populates="job", cascade="all, delete-orphan"
+    )
 
     __table_args__ = (
-        Index("idx_jobs_user", "user_id"),
+        # Active-job and filtered history lists seek on user + status and read
+        # back in created_at order; the per-server queue-limit count is answered
+        # from the index alone; unfiltered history lists a user's jobs newest
+        # first. All three also serve plain user_id lookups.
+        Index("idx_jobs_user_status_created", "user_id", "status", "created_at"),
+        Index("idx_jobs_user_server_status", "user_id", "server_id", "status"),
+        Index("idx_jobs_user_created", "user_id", "created_at"),
         Index("idx_jobs_status", "status"),
         Index("idx_jobs_created", "created_at"),
     )
@@ -220,3 +416,24 @@ class Job(Base):
 
     def __repr__(self) -> str:
         return f"<Job(id={self.id}, prompt_id={self.prompt_id}, status={self.status})>"
+
+
+class JobPayload(Base):
+    """
+    Workflow JSON submitted for a job.
+
+    Kept out of the jobs table so status and history scans don't page
+    through multi-kilobyte workflow documents; it is only read to rerun a job.
+    """
+    __tablename__ = "job_payloads"
+
+    job_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("jobs.id"), primary_key=True, autoincrement=False
+    )
+    workflow_json: Mapped[Optional[dict]] = mapped_column(JSONText)
+
+    # Relationships
+    job: Mapped["Job"] = relationship(back_populates="payload")
+
+    def __repr__(self) -> str:
+        return f"<JobPayload(job_id={self.job_id})>"
@@ -4,14 +4,40 @@ Data access layer for bot database operations.
 Provides async CRUD operations for all database models.
 """
 
-import json
-from datetime import datetime
-from typing import Optional
-
-from sqlalchemy import select, update, delete, func
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import selectinload
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import (
+    Text,
+    and_,
+    bindparam,
+    case,
+    delete,
+    event,
+    exists,
+    func,
+    insert,
+    inspect,
+    literal,
+    or_,
+    select,
+    type_coerce,
+    update,
+)
+from sqlalchemy.sql import column, table
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import contains_eager, selectinload
 
+from .. import jsonutil
 from .models import (
     Base,
     User,
@@ -19,12 +45,205 @@ from .models import (
     ServerRole,
     Template,
     Job,
+    JobPayload,
+    PromptId,
     Workflow,
     JobStatus,
     PermissionLevel,
+    ACTIVE_JOB_STATUSES,
+    FINISHED_JOB_STATUSES,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL is still crash-safe in WAL mode.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache
+    "PRAGMA temp_store=MEMORY",
 )
 
 
+# How long a resolved Discord ID -> primary key mapping is reused. Users and
+# servers are never deleted, so this only bounds how long entries linger.
+ID_CACHE_TTL = 300.0
+
+# Buffered progress updates are written together at most this often (seconds)
+PROGRESS_FLUSH_INTERVAL = 0.2
+
+# Connection pool for server databases (PostgreSQL, MySQL, ...). Sized for
+# bursts of concurrent commands; connections are checked before use and
+# replaced after POOL_RECYCLE seconds so server-side idle timeouts never bite.
+# SQLite keeps SQLAlchemy's default async queue pool: a single shared
+# StaticPool connection would interleave concurrent sessions' transactions.
+POOL_OPTIONS = {
+    "pool_size": 20,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+# database URL -> (engine, session factory), shared by every Repository on that
+# URL so re-created repositories (cog reloads, tests) reuse one connection pool
+_engines: dict[str, tuple[AsyncEngine, async_sessionmaker]] = {}
+# database URL -> number of open Repository instances using its engine
+_engine_holders: dict[str, int] = {}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _upsert_insert(dialect_name: str):
+    """The dialect's insert() with ON CONFLICT support, or None if it has none."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+
+def _json_array_extend(column, items: list, dialect_name: str):
+    """
+    SQL expression appending items to the JSON array stored in column.
+
+    PostgreSQL concatenates the JSONB arrays natively. Elsewhere this works
+    on the serialized text, '[a,b]' + '[c]' -> '[a,b,c]'. Either way the
+    current value never has to be read back into Python first.
+    """
+    if dialect_name == "postgresql":
+        return func.coalesce(column, type_coerce([], column.type)) + type_coerce(items, column.type)
+    if not items:
+        return func.coalesce(type_coerce(column, Text), "[]")
+    current = type_coerce(column, Text)
+    new = jsonutil.dumps(items)
+    return case(
+        (or_(current.is_(None), current == "[]"), literal(new, Text)),
+        else_=func.substr(current, 1, func.length(current) - 1, type_=Text)
+        + ","
+        + literal(new[1:], Text),
+    )
+
+
+def _create_schema(sync_conn) -> None:
+    Base.metadata.create_all(sync_conn)
+    _clear_extra_default_workflows(sync_conn)
+    # create_all skips tables that already exist, so indexes added to the
+    # models later would never reach older databases without this
+    for model_table in Base.metadata.sorted_tables:
+        for index in model_table.indexes:
+            index.create(sync_conn, checkfirst=True)
+    _move_inline_workflows(sync_conn)
+    _encode_text_prompt_ids(sync_conn)
+
+
+def _clear_extra_default_workflows(sync_conn) -> None:
+    """Keep one default workflow so older databases can take uq_workflows_default."""
+    workflows = table("workflows", column("id"), column("is_default"))
+    # The newest default wins, as it would have after save_workflow
+    newest = (
+        select(func.max(workflows.c.id))
+        .where(workflows.c.is_default == True)
+        .scalar_subquery()
+    )
+    sync_conn.execute(
+        workflows.update()
+        .where(workflows.c.is_default == True, workflows.c.id != newest)
+        .values(is_default=False)
+    )
+
+
+def _move_inline_workflows(sync_conn) -> None:
+    """Move workflow JSON that older databases stored on jobs into job_payloads."""
+    if "workflow_json" not in {c["name"] for c in inspect(sync_conn).get_columns("jobs")}:
+        return
+
+    jobs = table("jobs", column("id"), column("workflow_json"))
+    payloads = JobPayload.__table__
+    sync_conn.execute(
+        payloads.insert().from_select(
+            ["job_id", "workflow_json"],
+            select(jobs.c.id, jobs.c.workflow_json).where(
+                jobs.c.workflow_json.is_not(None),
+                ~exists().where(payloads.c.job_id == jobs.c.id),
+            ),
+        )
+    )
+    # Clear the moved copies so the jobs rows shrink and later starts skip them
+    sync_conn.execute(
+        jobs.update().where(jobs.c.workflow_json.is_not(None)).values(workflow_json=None)
+    )
+
+
+def _encode_text_prompt_ids(sync_conn) -> None:
+    """Re-encode prompt IDs that older databases stored as text into PromptId bytes."""
+    # Only SQLite lets text and blob values share the column; elsewhere the
+    # column type was fixed when the table was created
+    if sync_conn.dialect.name != "sqlite":
+        return
+
+    jobs = table("jobs", column("id"), column("prompt_id"))
+    rows = sync_conn.execute(
+        select(jobs.c.id, jobs.c.prompt_id).where(func.typeof(jobs.c.prompt_id) == "text")
+    ).all()
+    if not rows:
+        return
+
+    encode = PromptId().process_bind_param
+    sync_conn.execute(
+        jobs.update()
+        .where(jobs.c.id == bindparam("job_id"))
+        .values(prompt_id=bindparam("encoded")),
+        [{"job_id": job_id, "encoded": encode(prompt_id, sync_conn.dialect)} for job_id, prompt_id in rows],
+    )
+
+
+def _get_engine(database_url: str) -> tuple[AsyncEngine, async_sessionmaker]:
+    """Return the shared engine and session factory for database_url and hold them."""
+    _engine_holders[database_url] = _engine_holders.get(database_url, 0) + 1
+    if database_url in _engines:
+        return _engines[database_url]
+
+    engine_options = {}
+    if not database_url.startswith("sqlite"):
+        engine_options.update(POOL_OPTIONS)
+    if database_url.startswith("postgresql"):
+        # JSONB columns are (de)serialized by the driver; use the bot's helpers
+        engine_options.update(json_serializer=jsonutil.dumps, json_deserializer=jsonutil.loads)
+    engine = create_async_engine(database_url, echo=False, **engine_options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    session_factory = async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+    _engines[database_url] = (engine, session_factory)
+    return engine, session_factory
+
+
+def _release_engine(database_url: str) -> bool:
+    """Drop a hold taken by _get_engine; True if it was the last one."""
+    holders = _engine_holders.get(database_url, 0) - 1
+    if holders > 0:
+        _engine_holders[database_url] = holders
+        return False
+    _engine_holders.pop(database_url, None)
+    _engines.pop(database_url, None)
+    return True
+
+
 class Repository:
     """Async repository for database operations."""
 
@@ -35,48 +254,151 @@ class Repository:
         Args:
             database_url: SQLAlchemy async database URL
         """
-        self.engine = create_async_engine(database_url, echo=False)
-        self.async_session = async_sessionmaker(
-            self.engine,
-            class_=AsyncSession,
-            expire_on_commit=False,
-        )
+        self.database_url = database_url
+        self.engine, self.async_session = _get_engine(database_url)
+        self._holds_engine = True
+        # Used for single-statement get-or-create; None falls back to SELECT first
+        self._upsert = _upsert_insert(self.engine.dialect.name)
+        # discord_id -> (resolved_at, primary key), see _user_id()/_server_id()
+        self._user_ids: dict[int, tuple[float, int]] = {}
+        self._server_ids: dict[int, tuple[float, int]] = {}
+        # prompt_id -> (progress, progress_max) awaiting flush_progress()
+        self._pending_progress: dict[str, tuple[int, int]] = {}
+        self._progress_task: Optional[asyncio.Task] = None
 
     async def init_db(self) -> None:
-        """Create all database tables."""
+        """Create all database tables and any indexes missing from existing ones."""
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_create_schema)
 
     async def close(self) -> None:
-        """Close the database connection."""
-        await self.engine.dispose()
+        """Write any buffered progress and close the database connection."""
+        if self._progress_task and not self._progress_task.done():
+            self._progress_task.cancel()
+        await self.flush_progress()
+        if not self._holds_engine:
+            return
+        self._holds_engine = False
+        # Other open repositories on this URL keep using the shared engine;
+        # the last one to close disposes it
+        if _release_engine(self.database_url):
+            await self.engine.dispose()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        """
+        Session for running several Repository calls as one transaction.
+
+        Pass it as the session argument of methods that accept one; they then
+        flush instead of committing, and everything commits together when
+        the block exits (or rolls back if it raises).
+        """
+        async with self.async_session() as session:
+            async with session.begin():
+                yield session
+            self._run_after_commit(session)
+
+    @asynccontextmanager
+    async def _session(self, session: Optional[AsyncSession]) -> AsyncIterator[AsyncSession]:
+        """Use the caller's transaction if given, else a new session committed on exit."""
+        if session is not None:
+            yield session
+            return
+        async with self.async_session() as session:
+            yield session
+            await session.commit()
+            self._run_after_commit(session)
+
+    @staticmethod
+    def _after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+        """Run callback once the session's transaction has committed."""
+        session.info.setdefault("after_commit", []).append(callback)
+
+    @staticmethod
+    def _run_after_commit(session: AsyncSession) -> None:
+        for callback in session.info.pop("after_commit", ()):
+            callback()
+
+    @staticmethod
+    def _cached_id(cache: dict[int, tuple[float, int]], discord_id: int) -> Optional[int]:
+        entry = cache.get(discord_id)
+        if entry and time.monotonic() - entry[0] < ID_CACHE_TTL:
+            return entry[1]
+        return None
+
+    def _user_id(self, discord_id: int):
+        """users.id for a Discord ID: the cached key, else a scalar subquery."""
+        user_id = self._cached_id(self._user_ids, discord_id)
+        if user_id is not None:
+            return user_id
+        return select(User.id).where(User.discord_id == discord_id).scalar_subquery()
+
+    def _server_id(self, discord_id: int):
+        """servers.id for a Discord ID: the cached key, else a scalar subquery."""
+        server_id = self._cached_id(self._server_ids, discord_id)
+        if server_id is not None:
+            return server_id
+        return select(Server.id).where(Server.discord_id == discord_id).scalar_subquery()
 
     # ==================== User Operations ====================
 
     async def get_or_create_user(
         self,
-        discord_id: str,
+        discord_id: int,
         username: str,
+        session: Optional[AsyncSession] = None,
     ) -> User:
         """Get existing user or create new one."""
-        async with self.async_session() as session:
+        async with self._session(session) as session:
+            user = await self._get_or_create_user(session, discord_id, username)
+            if session.new or session.dirty:
+                await session.flush()
+            self._after_commit(
+                session, lambda: self._user_ids.__setitem__(discord_id, (time.monotonic(), user.id))
+            )
+            return user
+
+    async def _get_or_create_user(
+        self,
+        session: AsyncSession,
+        discord_id: int,
+        username: str,
+    ) -> User:
+        """Get or stage a user within an open session; the caller commits."""
+        if self._upsert is not None:
+            # One INSERT ... ON CONFLICT; a placeholder name never overwrites
+            # a known one, and updated_at only moves on an actual rename
+            stmt = self._upsert(User).values(discord_id=discord_id, username=username)
+            renamed = and_(
+                stmt.excluded.username != "Unknown",
+                stmt.excluded.username != User.username,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.discord_id],
+                set_={
+                    "username": case((renamed, stmt.excluded.username), else_=User.username),
+                    "updated_at": case((renamed, func.now()), else_=User.updated_at),
+                },
+            ).returning(User)
             result = await session.execute(
-                select(User).where(User.discord_id == discord_id)
+                stmt, execution_options={"populate_existing": True}
             )
-            user = result.scalar_one_or_none()
+            return result.scalar_one()
 
-            if user is None:
-                user = User(discord_id=discord_id, username=username)
-                session.add(user)
-                await session.commit()
-                await session.refresh(user)
-            elif user.username != username and username != "Unknown":
-                user.username = username
-                await session.commit()
+        result = await session.execute(
+            select(User).where(User.discord_id == discord_id)
+        )
+        user = result.scalar_one_or_none()
 
-            return user
+        if user is None:
+            user = User(discord_id=discord_id, username=username)
+            session.add(user)
+        elif user.username != username and username != "Unknown":
+            user.username = username
 
-    async def get_user(self, discord_id: str) -> Optional[User]:
+        return user
+
+    async def get_user(self, discord_id: int) -> Optional[User]:
         """Get user by Discord ID."""
         async with self.async_session() as session:
             result = await session.execute(
@@ -86,160 +408,181 @@ class Repository:
 
     async def update_user_delivery(
         self,
-        discord_id: str,
+        discord_id: int,
         delivery_type: str,
     ) -> Optional[User]:
         """Update user's default delivery preference."""
         async with self.async_session() as session:
             result = await session.execute(
-                select(User).where(User.discord_id == discord_id)
+                update(User)
+                .where(User.discord_id == discord_id)
+                .values(default_delivery=delivery_type)
+                .returning(User)
             )
             user = result.scalar_one_or_none()
-            if user:
-                user.default_delivery = delivery_type
-                await session.commit()
+            await session.commit()
             return user
 
     # ==================== Server Operations ====================
 
     async def get_or_create_server(
         self,
-        discord_id: str,
+        discord_id: int,
         name: str,
+        session: Optional[AsyncSession] = None,
     ) -> Server:
         """Get existing server or create new one."""
-        async with self.async_session() as session:
+        async with self._session(session) as session:
+            server = await self._get_or_create_server(session, discord_id, name)
+            if session.new or session.dirty:
+                await session.flush()
+            self._after_commit(
+                session, lambda: self._server_ids.__setitem__(discord_id, (time.monotonic(), server.id))
+            )
+            return server
+
+    async def _get_or_create_server(
+        self,
+        session: AsyncSession,
+        discord_id: int,
+        name: str,
+    ) -> Server:
+        """Get or stage a server within an open session; the caller commits."""
+        if self._upsert is not None:
+            stmt = self._upsert(Server).values(discord_id=discord_id, name=name)
+            renamed = stmt.excluded.name != Server.name
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Server.discord_id],
+                set_={
+                    "name": stmt.excluded.name,
+                    "updated_at": case((renamed, func.now()), else_=Server.updated_at),
+                },
+            ).returning(Server)
             result = await session.execute(
-                select(Server).where(Server.discord_id == discord_id)
+                stmt, execution_options={"populate_existing": True}
             )
-            server = result.scalar_one_or_none()
+            return result.scalar_one()
 
-            if server is None:
-                server = Server(discord_id=discord_id, name=name)
-                session.add(server)
-                await session.commit()
-                await session.refresh(server)
-            elif server.name != name:
-                server.name = name
-                await session.commit()
+        result = await session.execute(
+            select(Server).where(Server.discord_id == discord_id)
+        )
+        server = result.scalar_one_or_none()
 
-            return server
+        if server is None:
+            server = Server(discord_id=discord_id, name=name)
+            session.add(server)
+        elif server.name != name:
+            server.name = name
+
+        return server
 
-    async def get_server(self, discord_id: str) -> Optional[Server]:
+    async def get_server(
+        self,
+        discord_id: int,
+        session: Optional[AsyncSession] = None,
+    ) -> Optional[Server]:
         """Get server by Discord ID."""
-        async with self.async_session() as session:
+        async with self._session(session) as session:
             result = await session.execute(
-                select(Server)
-                .options(selectinload(Server.roles))
-                .where(Server.discord_id == discord_id)
+                select(Server).where(Server.discord_id == discord_id)
             )
             return result.scalar_one_or_none()
 
     async def update_server_channel(
         self,
-        discord_id: str,
-        channel_id: str,
+        discord_id: int,
+        channel_id: int,
     ) -> Optional[Server]:
         """Update server's default output channel."""
         async with self.async_session() as session:
             result = await session.execute(
-                select(Server).where(Server.discord_id == discord_id)
+                update(Server)
+                .where(Server.discord_id == discord_id)
+                .values(default_channel_id=channel_id)
+                .returning(Server)
             )
             server = result.scalar_one_or_none()
-            if server:
-                server.default_channel_id = channel_id
-                await session.commit()
+            await session.commit()
             return server
 
     async def update_server_queue_limit(
         self,
-        discord_id: str,
+        discord_id: int,
         limit: int,
     ) -> Optional[Server]:
         """Update server's per-user queue limit."""
         async with self.async_session() as session:
             result = await session.execute(
-                select(Server).where(Server.discord_id == discord_id)
+                update(Server)
+                .where(Server.discord_id == discord_id)
+                .values(max_queue_per_user=limit)
+                .returning(Server)
             )
             server = result.scalar_one_or_none()
-            if server:
-                server.max_queue_per_user = limit
-                await session.commit()
+            await session.commit()
             return server
 
     # ==================== Role Operations ====================
 
     async def set_server_role(
         self,
-        server_discord_id: str,
-        role_discord_id: str,
+        server_discord_id: int,
+        role_discord_id: int,
         permission_level: str,
+        session: Optional[AsyncSession] = None,
     ) -> ServerRole:
         """Set or update a role's permission level for a server."""
-        async with self.async_session() as session:
-            # Get server
-            server_result = await session.execute(
-                select(Server).where(Server.discord_id == server_discord_id)
-            )
-            server = server_result.scalar_one_or_none()
-            if not server:
-                raise ValueError(f"Server {server_discord_id} not found")
-
-            # Check for existing role mapping
-            role_result = await session.execute(
-                select(ServerRole).where(
-                    ServerRole.server_id == server.id,
-                    ServerRole.role_discord_id == role_discord_id,
+        async with self._session(session) as session:
+            # Resolve the server and any existing mapping in one query
+            result = await session.execute(
+                select(Server.id, ServerRole)
+                .outerjoin(
+                    ServerRole,
+                    and_(
+                        ServerRole.server_id == Server.id,
+                        ServerRole.role_discord_id == role_discord_id,
+                    ),
                 )
+                .where(Server.discord_id == server_discord_id)
             )
-            role = role_result.scalar_one_or_none()
+            row = result.first()
+            if row is None:
+                raise ValueError(f"Server {server_discord_id} not found")
+            server_id, role = row
 
             if role:
                 role.permission_level = permission_level
             else:
                 role = ServerRole(
-                    server_id=server.id,
+                    server_id=server_id,
                     role_discord_id=role_discord_id,
                     permission_level=permission_level,
                 )
                 session.add(role)
 
-            await session.commit()
-            await session.refresh(role)
+            await session.flush()
             return role
 
-    async def get_server_roles(self, server_discord_id: str) -> list[ServerRole]:
+    async def get_server_roles(self, server_discord_id: int) -> list[ServerRole]:
         """Get all role mappings for a server."""
         async with self.async_session() as session:
-            server_result = await session.execute(
-                select(Server).where(Server.discord_id == server_discord_id)
-            )
-            server = server_result.scalar_one_or_none()
-            if not server:
-                return []
-
             result = await session.execute(
-                select(ServerRole).where(ServerRole.server_id == server.id)
+                select(ServerRole).where(
+                    ServerRole.server_id == self._server_id(server_discord_id)
+                )
             )
             return list(result.scalars().all())
 
     async def delete_server_role(
         self,
-        server_discord_id: str,
-        role_discord_id: str,
+        server_discord_id: int,
+        role_discord_id: int,
     ) -> bool:
         """Remove a role mapping."""
         async with self.async_session() as session:
-            server_result = await session.execute(
-                select(Server).where(Server.discord_id == server_discord_id)
-            )
-            server = server_result.scalar_one_or_none()
-            if not server:
-                return False
-
             result = await session.execute(
                 delete(ServerRole).where(
-                    ServerRole.server_id == server.id,
+                    ServerRole.server_id == self._server_id(server_discord_id),
                     ServerRole.role_discord_id == role_discord_id,
                 )
             )
@@ -250,149 +593,241 @@ class Repository:
 
     async def create_template(
         self,
-        user_discord_id: str,
+        user_discord_id: int,
         name: str,
         positive_prompt: str,
         negative_prompt: str = "",
         parameters: Optional[dict] = None,
-        server_discord_id: Optional[str] = None,
-    ) -> Template:
-        """Create a new prompt template."""
+        server_discord_id: Optional[int] = None,
+        username: Optional[str] = None,
+        server_name: Optional[str] = None,
+    ) -> Optional[Template]:
+        """
+        Create a new prompt template.
+
+        When username/server_name are given, the user/server rows are created
+        or updated in the same transaction instead of requiring a prior
+        get_or_create call.
+
+        Returns None if the user already has a template with this name in
+        the same scope.
+        """
         async with self.async_session() as session:
             # Get user
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
-            )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                raise ValueError(f"User {user_discord_id} not found")
+            if username is not None:
+                user = await self._get_or_create_user(session, user_discord_id, username)
+            else:
+                user_result = await session.execute(
+                    select(User).where(User.discord_id == user_discord_id)
+                )
+                user = user_result.scalar_one_or_none()
+                if not user:
+                    raise ValueError(f"User {user_discord_id} not found")
 
             # Get server if provided
-            server_id = None
+            server = None
             if server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
+                if server_name is not None:
+                    server = await self._get_or_create_server(
+                        session, server_discord_id, server_name
+                    )
+                else:
+                    server_result = await session.execute(
+                        select(Server).where(Server.discord_id == server_discord_id)
+                    )
+                    server = server_result.scalar_one_or_none()
+
+            # Check for a duplicate up front; the unique constraint alone does
+            # not catch private templates since NULL server_ids never collide
+            if user.id is not None and (server is None or server.id is not None):
+                same_scope = (
+                    Template.server_id == server.id
+                    if server
+                    else Template.server_id.is_(None)
+                )
+                existing = await session.execute(
+                    select(Template.id)
+                    .where(Template.user_id == user.id, same_scope, Template.name == name)
+                    .limit(1)
                 )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    server_id = server.id
+                if existing.first() is not None:
+                    return None
 
             template = Template(
-                user_id=user.id,
-                server_id=server_id,
+                user=user,
+                server=server,
                 name=name,
                 positive_prompt=positive_prompt,
                 negative_prompt=negative_prompt,
-                parameters=json.dumps(parameters) if parameters else None,
+                parameters=parameters or None,
             )
             session.add(template)
-            await session.commit()
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Lost a race with a concurrent save of the same name
+                await session.rollback()
+                return None
             await session.refresh(template)
             return template
 
     async def get_template(
         self,
-        user_discord_id: str,
+        user_discord_id: int,
         name: str,
-        server_discord_id: Optional[str] = None,
+        server_discord_id: Optional[int] = None,
     ) -> Optional[Template]:
         """Get a template by name."""
         async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
+            result = await session.execute(
+                select(Template).where(
+                    Template.user_id == self._user_id(user_discord_id),
+                    Template.name == name,
+                    self._template_server(server_discord_id),
+                )
             )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                return None
+            return result.scalar_one_or_none()
 
-            # Build query
-            query = select(Template).where(
-                Template.user_id == user.id,
-                Template.name == name,
-            )
+    def _template_server(self, server_discord_id: Optional[int]):
+        """Match templates shared in the given server, or private ones if None."""
+        if server_discord_id:
+            return Template.server_id == self._server_id(server_discord_id)
+        return Template.server_id.is_(None)
 
-            if server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
-                )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    query = query.where(Template.server_id == server.id)
-            else:
-                query = query.where(Template.server_id.is_(None))
+    def _template_scope(
+        self,
+        user_discord_id: int,
+        server_discord_id: Optional[int],
+        owned_only: bool,
+    ):
+        """
+        Build the WHERE clause for templates visible in a context.
 
-            result = await session.execute(query)
+        Matches the user's private templates plus, when server_discord_id is
+        given, that server's shared templates (only the user's own if owned_only).
+        """
+        user_id = self._user_id(user_discord_id)
+        clause = and_(Template.user_id == user_id, Template.server_id.is_(None))
+        if server_discord_id is not None:
+            shared = Template.server_id == self._server_id(server_discord_id)
+            if owned_only:
+                shared = and_(shared, Template.user_id == user_id)
+            clause = or_(clause, shared)
+        return clause
+
+    async def get_template_for_context(
+        self,
+        user_discord_id: int,
+        name: str,
+        server_discord_id: Optional[int] = None,
+    ) -> Optional[Template]:
+        """
+        Get a template by name in one query, preferring the user's private
+        template over a shared server template of the same name.
+        """
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Template)
+                .where(
+                    Template.name == name,
+                    self._template_scope(user_discord_id, server_discord_id, owned_only=False),
+                )
+                .order_by(Template.server_id.is_not(None))
+                .limit(1)
+            )
             return result.scalar_one_or_none()
 
-    async def list_templates(
+    async def delete_template_for_context(
         self,
-        user_discord_id: str,
-        server_discord_id: Optional[str] = None,
-        include_shared: bool = True,
-    ) -> list[Template]:
-        """List templates for a user."""
+        user_discord_id: int,
+        name: str,
+        server_discord_id: Optional[int] = None,
+    ) -> bool:
+        """
+        Delete one of the user's templates by name in one statement, preferring
+        the private template over the user's shared template in the server.
+        """
         async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
+            target = (
+                select(Template.id)
+                .where(
+                    Template.name == name,
+                    self._template_scope(user_discord_id, server_discord_id, owned_only=True),
+                )
+                .order_by(Template.server_id.is_not(None))
+                .limit(1)
+                .scalar_subquery()
             )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                return []
+            result = await session.execute(delete(Template).where(Template.id == target))
+            await session.commit()
+            return result.rowcount > 0
 
-            # Private templates
-            query = select(Template).where(
-                Template.user_id == user.id,
-                Template.server_id.is_(None),
+    async def search_templates(
+        self,
+        user_discord_id: int,
+        query: str,
+        server_discord_id: Optional[int] = None,
+        limit: int = 25,
+    ) -> list[str]:
+        """
+        Get up to limit distinct template names visible in a context that
+        contain query (case-insensitive), ordered by name.
+        """
+        # Escape LIKE wildcards so user input matches literally
+        pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Template.name)
+                .where(
+                    self._template_scope(user_discord_id, server_discord_id, owned_only=False),
+                    Template.name.ilike(f"%{pattern}%", escape="\\"),
+                )
+                .distinct()
+                .order_by(Template.name)
+                .limit(limit)
             )
-            result = await session.execute(query)
-            templates = list(result.scalars().all())
+            return list(result.scalars().all())
 
-            # Shared templates in server
-            if include_shared and server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
-                )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    shared_query = select(Template).where(
-                        Template.server_id == server.id
-                    )
-                    shared_result = await session.execute(shared_query)
-                    templates.extend(shared_result.scalars().all())
+    async def list_templates(
+        self,
+        user_discord_id: int,
+        server_discord_id: Optional[int] = None,
+        include_shared: bool = True,
+        limit: Optional[int] = None,
+    ) -> list[Template]:
+        """List templates for a user, private ones first, each sorted by name."""
+        scope = self._template_scope(
+            user_discord_id,
+            server_discord_id if include_shared else None,
+            owned_only=False,
+        )
+        query = (
+            select(Template)
+            .where(scope)
+            .order_by(Template.server_id.is_not(None), Template.name)
+        )
+        if limit is not None:
+            query = query.limit(limit)
 
-            return templates
+        async with self.async_session() as session:
+            result = await session.execute(query)
+            return list(result.scalars().all())
 
     async def delete_template(
         self,
-        user_discord_id: str,
+        user_discord_id: int,
         name: str,
-        server_discord_id: Optional[str] = None,
+        server_discord_id: Optional[int] = None,
     ) -> bool:
         """Delete a template."""
         async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
-            )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                return False
-
-            query = delete(Template).where(
-                Template.user_id == user.id,
-                Template.name == name,
-            )
-
-            if server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
+            result = await session.execute(
+                delete(Template).where(
+                    Template.user_id == self._user_id(user_discord_id),
+                    Template.name == name,
+                    self._template_server(server_discord_id),
                 )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    query = query.where(Template.server_id == server.id)
-            else:
-                query = query.where(Template.server_id.is_(None))
-
-            result = await session.execute(query)
+            )
             await session.commit()
             return result.rowcount > 0
 
@@ -401,66 +836,129 @@ class Repository:
     async def create_job(
         self,
         prompt_id: str,
-        user_discord_id: str,
+        user_discord_id: int,
         positive_prompt: str,
         negative_prompt: str = "",
         parameters: Optional[dict] = None,
-        workflow_json: Optional[str] = None,
+        workflow_json: Optional[dict] = None,
         delivery_type: str = "channel",
-        server_discord_id: Optional[str] = None,
-        channel_id: Optional[str] = None,
+        server_discord_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+        session: Optional[AsyncSession] = None,
     ) -> Job:
         """Create a new generation job."""
-        async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
-            )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                raise ValueError(f"User {user_discord_id} not found")
-
-            server_id = None
-            if server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
+        async with self._session(session) as session:
+            # The user's key is usually cached by the preflight get_or_create_user;
+            # look it up otherwise so an unknown user is reported as such
+            user_id = self._cached_id(self._user_ids, user_discord_id)
+            if user_id is None:
+                user_id = await session.scalar(
+                    select(User.id).where(User.discord_id == user_discord_id)
                 )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    server_id = server.id
+                if user_id is None:
+                    raise ValueError(f"User {user_discord_id} not found")
 
+            # An unknown server leaves server_id NULL
             job = Job(
                 prompt_id=prompt_id,
-                user_id=user.id,
-                server_id=server_id,
+                user_id=user_id,
+                server_id=self._server_id(server_discord_id) if server_discord_id else None,
                 channel_id=channel_id,
                 positive_prompt=positive_prompt,
                 negative_prompt=negative_prompt,
-                parameters=json.dumps(parameters) if parameters else None,
-                workflow_json=workflow_json,
+                parameters=parameters or None,
                 delivery_type=delivery_type,
             )
+            if workflow_json is not None:
+                job.payload = JobPayload(workflow_json=workflow_json)
             session.add(job)
-            await session.commit()
+            await session.flush()
             await session.refresh(job)
             return job
 
-    async def get_job(self, prompt_id: str) -> Optional[Job]:
-        """Get a job by prompt ID."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Job)
-                .options(selectinload(Job.user))
-                .where(Job.prompt_id == prompt_id)
+    async def create_jobs_bulk(
+        self,
+        jobs: list[dict],
+        session: Optional[AsyncSession] = None,
+    ) -> list[Job]:
+        """
+        Create several jobs with one INSERT.
+
+        Args:
+            jobs: One dict per job, with the same keys as create_job's arguments
+
+        Returns:
+            The created jobs, in the order given
+        """
+        if not jobs:
+            return []
+
+        async with self._session(session) as session:
+            # Resolve every referenced user/server in one query each
+            user_ids = dict((await session.execute(
+                select(User.discord_id, User.id)
+                .where(User.discord_id.in_({j["user_discord_id"] for j in jobs}))
+            )).all())
+            server_discord_ids = {j["server_discord_id"] for j in jobs if j.get("server_discord_id")}
+            server_ids = dict((await session.execute(
+                select(Server.discord_id, Server.id)
+                .where(Server.discord_id.in_(server_discord_ids))
+            )).all()) if server_discord_ids else {}
+
+            rows = []
+            for j in jobs:
+                if j["user_discord_id"] not in user_ids:
+                    raise ValueError(f"User {j['user_discord_id']} not found")
+                rows.append({
+                    "prompt_id": j["prompt_id"],
+                    "user_id": user_ids[j["user_discord_id"]],
+                    "server_id": server_ids.get(j.get("server_discord_id")),
+                    "channel_id": j.get("channel_id"),
+                    "positive_prompt": j["positive_prompt"],
+                    "negative_prompt": j.get("negative_prompt", ""),
+                    "parameters": j.get("parameters") or None,
+                    "delivery_type": j.get("delivery_type", "channel"),
+                })
+
+            result = await session.scalars(
+                insert(Job).returning(Job, sort_by_parameter_order=True), rows
             )
+            created = list(result.all())
+
+            payloads = [
+                {"job_id": job.id, "workflow_json": j["workflow_json"]}
+                for job, j in zip(created, jobs)
+                if j.get("workflow_json") is not None
+            ]
+            if payloads:
+                await session.execute(insert(JobPayload), payloads)
+            return created
+
+    async def get_job(self, prompt_id: str, load_user: bool = False) -> Optional[Job]:
+        """Get a job by prompt ID. Pass load_user=True to access job.user."""
+        query = select(Job).where(Job.prompt_id == prompt_id)
+        if load_user:
+            query = query.options(selectinload(Job.user))
+
+        async with self.async_session() as session:
+            result = await session.execute(query)
+            return result.scalar_one_or_none()
+
+    async def get_job_by_id(self, job_id: int, load_user: bool = False) -> Optional[Job]:
+        """Get a job by internal ID. Pass load_user=True to access job.user."""
+        query = select(Job).where(Job.id == job_id)
+        if load_user:
+            query = query.options(selectinload(Job.user))
+
+        async with self.async_session() as session:
+            result = await session.execute(query)
             return result.scalar_one_or_none()
 
-    async def get_job_by_id(self, job_id: int) -> Optional[Job]:
-        """Get a job by internal ID."""
+    async def get_job_workflow(self, job_id: int) -> Optional[dict]:
+        """Get the workflow JSON a job was submitted with."""
         async with self.async_session() as session:
             result = await session.execute(
-                select(Job)
-                .options(selectinload(Job.user))
-                .where(Job.id == job_id)
+                select(JobPayload.workflow_json).where(JobPayload.job_id == job_id)
             )
             return result.scalar_one_or_none()
 
@@ -469,97 +967,159 @@ class Repository:
         prompt_id: str,
         status: str,
         error_message: Optional[str] = None,
-        output_images: Optional[list[str]] = None,
+        output_images: Optional[list[dict]] = None,
+        load_user: bool = False,
     ) -> Optional[Job]:
-        """Update job status."""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(Job)
-                .options(selectinload(Job.user))
-                .where(Job.prompt_id == prompt_id)
-            )
-            job = result.scalar_one_or_none()
-            if not job:
-                return None
+        """
+        Update job status in a single UPDATE, returning the updated job.
+
+        Pass load_user=True to access job.user on the result.
+        """
+        values = {"status": status}
+
+        if status == JobStatus.RUNNING.value:
+            values["started_at"] = func.now()
+        elif status in FINISHED_JOB_STATUSES:
+            values["completed_at"] = func.now()
 
-            job.status = status
+        if error_message is not None:
+            values["error_message"] = error_message
 
-            if status == JobStatus.RUNNING.value:
-                job.started_at = datetime.utcnow()
-            elif status in (JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value):
-                job.completed_at = datetime.utcnow()
+        if output_images is not None:
+            values["output_images"] = _json_array_extend(
+                Job.output_images, output_images, self.engine.dialect.name
+            )
 
-            if error_message is not None:
-                job.error_message = error_message
+        # Fold in buffered progress so the final row has the latest values
+        pending = self._pending_progress.pop(prompt_id, None)
+        if pending is not None:
+            values["progress"], values["progress_max"] = pending
 
-            if output_images is not None:
-                current_images = []
-                if job.output_images:
-                    try:
-                        current_images = json.loads(job.output_images)
-                    except json.JSONDecodeError:
-                        current_images = []
-                
-                # Append new images
-                current_images.extend(output_images)
-                job.output_images = json.dumps(current_images)
+        query = update(Job).where(Job.prompt_id == prompt_id).values(values).returning(Job)
+        if load_user:
+            query = query.options(selectinload(Job.user))
 
+        async with self.async_session() as session:
+            result = await session.execute(query)
+            job = result.scalar_one_or_none()
             await session.commit()
             return job
 
+    async def cancel_jobs(self, job_ids: list[int]) -> list[tuple[str, str]]:
+        """
+        Cancel all pending/running jobs among job_ids in one transaction.
+
+        Returns:
+            (prompt_id, previous_status) for each job that was cancelled
+        """
+        if not job_ids:
+            return []
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Job.id, Job.prompt_id, Job.status)
+                .where(Job.id.in_(job_ids))
+                .where(Job.status.in_(ACTIVE_JOB_STATUSES))
+            )
+            rows = result.all()
+            if not rows:
+                return []
+
+            await session.execute(
+                update(Job)
+                .where(Job.id.in_([row.id for row in rows]))
+                .where(Job.status.in_(ACTIVE_JOB_STATUSES))
+                .values(status=JobStatus.CANCELLED.value, completed_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return [(row.prompt_id, row.status) for row in rows]
+
     async def update_job_progress(
         self,
         prompt_id: str,
         progress: int,
         progress_max: int,
-    ) -> Optional[Job]:
-        """Update job progress."""
+    ) -> None:
+        """
+        Record job progress.
+
+        Updates are buffered, keeping only the latest per job, and written in
+        a single UPDATE at most every PROGRESS_FLUSH_INTERVAL seconds.
+        """
+        self._pending_progress[prompt_id] = (progress, progress_max)
+        if self._progress_task is None or self._progress_task.done():
+            self._progress_task = asyncio.create_task(self._flush_progress_later())
+
+    async def _flush_progress_later(self) -> None:
+        await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+        # _progress_task keeps this task referenced until the flush completes,
+        # so it is not garbage collected and no second flush overlaps it
+        try:
+            await self.flush_progress()
+        except Exception as e:
+            logger.error(f"Failed to write job progress: {e}")
+        # Updates that arrived during the flush get the next one
+        self._progress_task = None
+        if self._pending_progress:
+            self._progress_task = asyncio.create_task(self._flush_progress_later())
+
+    async def flush_progress(self) -> None:
+        """Write all buffered progress updates in one statement."""
+        if not self._pending_progress:
+            return
+        pending, self._pending_progress = self._pending_progress, {}
+
+        # Compare against the column (not case(value=...)) so each prompt ID
+        # is bound with the column's type
+        matches = [(prompt_id, Job.prompt_id == prompt_id) for prompt_id in pending]
         async with self.async_session() as session:
-            result = await session.execute(
-                select(Job).where(Job.prompt_id == prompt_id)
+            await session.execute(
+                update(Job)
+                .where(Job.prompt_id.in_(list(pending)))
+                .values(
+                    progress=case(
+                        *((match, pending[prompt_id][0]) for prompt_id, match in matches),
+                        else_=Job.progress,
+                    ),
+                    progress_max=case(
+                        *((match, pending[prompt_id][1]) for prompt_id, match in matches),
+                        else_=Job.progress_max,
+                    ),
+                )
+                .execution_options(synchronize_session=False)
             )
-            job = result.scalar_one_or_none()
-            if job:
-                job.progress = progress
-                job.progress_max = progress_max
-                await session.commit()
-            return job
+            await session.commit()
 
     async def update_job_message(
         self,
         prompt_id: str,
-        message_id: str,
-    ) -> Optional[Job]:
-        """Update the Discord message ID for a job."""
+        message_id: int,
+    ) -> bool:
+        """Update the Discord message ID for a job. Returns False if not found."""
         async with self.async_session() as session:
             result = await session.execute(
-                select(Job).where(Job.prompt_id == prompt_id)
+                update(Job)
+                .where(Job.prompt_id == prompt_id)
+                .values(message_id=message_id)
             )
-            job = result.scalar_one_or_none()
-            if job:
-                job.message_id = message_id
-                await session.commit()
-            return job
+            await session.commit()
+            return result.rowcount > 0
 
     async def list_user_jobs(
         self,
-        user_discord_id: str,
+        user_discord_id: int,
         limit: int = 10,
         status: Optional[str] = None,
     ) -> list[Job]:
         """List jobs for a user."""
         async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
-            )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                return []
-
             query = (
                 select(Job)
-                .where(Job.user_id == user.id)
-                .order_by(Job.created_at.desc())
+                .join(Job.user)
+                .options(contains_eager(Job.user))
+                .where(Job.user_id == self._user_id(user_discord_id))
+                .order_by(Job.created_at.desc(), Job.id.desc())
                 .limit(limit)
             )
 
@@ -569,36 +1129,60 @@ class Repository:
             result = await session.execute(query)
             return list(result.scalars().all())
 
+    def _pending_jobs_count(self, user_discord_id: int, server_discord_id: Optional[int]):
+        """SELECT counting a user's pending/running jobs, optionally in one server."""
+        query = (
+            select(func.count(Job.id))
+            .where(Job.user_id == self._user_id(user_discord_id))
+            .where(Job.status.in_(ACTIVE_JOB_STATUSES))
+        )
+        if server_discord_id:
+            query = query.where(Job.server_id == self._server_id(server_discord_id))
+        return query
+
     async def count_user_pending_jobs(
         self,
-        user_discord_id: str,
-        server_discord_id: Optional[str] = None,
+        user_discord_id: int,
+        server_discord_id: Optional[int] = None,
+        session: Optional[AsyncSession] = None,
     ) -> int:
         """Count pending/running jobs for a user."""
-        async with self.async_session() as session:
-            user_result = await session.execute(
-                select(User).where(User.discord_id == user_discord_id)
+        async with self._session(session) as session:
+            result = await session.execute(
+                self._pending_jobs_count(user_discord_id, server_discord_id)
             )
-            user = user_result.scalar_one_or_none()
-            if not user:
-                return 0
+            return result.scalar() or 0
 
-            query = (
-                select(func.count(Job.id))
-                .where(Job.user_id == user.id)
-                .where(Job.status.in_([JobStatus.PENDING.value, JobStatus.RUNNING.value]))
+    async def get_queue_usage(
+        self,
+        user_discord_id: int,
+        server_discord_id: Optional[int] = None,
+        session: Optional[AsyncSession] = None,
+    ) -> tuple[int, Optional[int]]:
+        """
+        Count a user's pending/running jobs and read the server's queue limit in one query.
+
+        Returns:
+            (active job count, the server's max_queue_per_user or None if
+            no server is given or it is not registered)
+        """
+        limit = None
+        if server_discord_id:
+            limit = (
+                select(Server.max_queue_per_user)
+                .where(Server.discord_id == server_discord_id)
+                .scalar_subquery()
             )
 
-            if server_discord_id:
-                server_result = await session.execute(
-                    select(Server).where(Server.discord_id == server_discord_id)
+        async with self._session(session) as session:
+            result = await session.execute(
+                select(
+                    self._pending_jobs_count(user_discord_id, server_discord_id).scalar_subquery(),
+                    limit if limit is not None else literal(None),
                 )
-                server = server_result.scalar_one_or_none()
-                if server:
-                    query = query.where(Job.server_id == server.id)
-
-            result = await session.execute(query)
-            return result.scalar() or 0
+            )
+            count, max_queue = result.one()
+            return count or 0, max_queue
 
     async def get_pending_jobs(self) -> list[Job]:
         """Get all pending jobs ordered by creation time."""
@@ -606,8 +1190,21 @@ class Repository:
             result = await session.execute(
                 select(Job)
                 .options(selectinload(Job.user))
-                .where(Job.status.in_([JobStatus.PENDING.value, JobStatus.RUNNING.value]))
-                .order_by(Job.created_at)
+                .where(Job.status.in_(ACTIVE_JOB_STATUSES))
+                .order_by(Job.created_at, Job.id)
+            )
+            return list(result.scalars().all())
+
+    async def get_pending_jobs_for_user(self, user_discord_id: int) -> list[Job]:
+        """Get a user's pending/running jobs ordered by creation time."""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(Job)
+                .join(Job.user)
+                .options(contains_eager(Job.user))
+                .where(User.discord_id == user_discord_id)
+                .where(Job.status.in_(ACTIVE_JOB_STATUSES))
+                .order_by(Job.created_at, Job.id)
             )
             return list(result.scalars().all())
 
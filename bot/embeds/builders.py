@@ -1,7 +1,14 @@
 import discord
 import logging
 from typing import Optional, List
-from datetime import datetime
+
+# Every progress bar that can be shown, indexed by tenths complete
+_PROGRESS_BARS = tuple("█" * i + "░" * (10 - i) for i in range(11))
+
+_QUEUED_COLOR = discord.Color.blue()
+_PROGRESS_COLOR = discord.Color.orange()
+_COMPLETED_COLOR = discord.Color.green()
+_FAILED_COLOR = discord.Color.red()
 
 class EmbedBuilder:
     """Helper for building Discord embeds."""
@@ -12,8 +19,8 @@ class EmbedBuilder:
         embed = discord.Embed(
             title="🎨 Generation Queued",
             description=f"**Prompt:** {job.positive_prompt}",
-            color=discord.Color.blue(),
-            timestamp=datetime.utcnow()
+            color=_QUEUED_COLOR,
+            timestamp=discord.utils.utcnow()
         )
         embed.add_field(name="Queue Position", value=str(position) if position > 0 else "Pending...", inline=True)
         embed.add_field(name="Status", value="Waiting to start...", inline=True)
@@ -26,13 +33,13 @@ class EmbedBuilder:
     def job_progress(job, progress: int, max_progress: int) -> discord.Embed:
         """Embed for running job with progress."""
         percent = int((progress / max_progress) * 100) if max_progress > 0 else 0
-        bars = "█" * (percent // 10) + "░" * (10 - (percent // 10))
+        bars = _PROGRESS_BARS[min(percent // 10, 10)]
         
         embed = discord.Embed(
             title="🎨 Generating...",
             description=f"**Prompt:** {job.positive_prompt}",
-            color=discord.Color.orange(),
-            timestamp=datetime.utcnow()
+            color=_PROGRESS_COLOR,
+            timestamp=discord.utils.utcnow()
         )
         embed.add_field(name="Progress", value=f"`{bars}` {percent}%", inline=False)
         if job.negative_prompt:
@@ -46,8 +53,8 @@ class EmbedBuilder:
         embed = discord.Embed(
             title="✨ Generation Complete!",
             description=f"**Prompt:** {job.positive_prompt}",
-            color=discord.Color.green(),
-            timestamp=datetime.utcnow()
+            color=_COMPLETED_COLOR,
+            timestamp=discord.utils.utcnow()
         )
         embed.add_field(name="Images", value=f"{image_count} generated", inline=True)
         embed.add_field(name="Duration", value=f"{job.duration:.1f}s" if hasattr(job, 'duration') and job.duration else "Done", inline=True)
@@ -64,8 +71,8 @@ class EmbedBuilder:
         embed = discord.Embed(
             title="❌ Generation Failed",
             description=f"**Prompt:** {job.positive_prompt}",
-            color=discord.Color.red(),
-            timestamp=datetime.utcnow()
+            color=_FAILED_COLOR,
+            timestamp=discord.utils.utcnow()
         )
         embed.add_field(name="Error", value=f"```{error_message}```", inline=False)
         embed.set_footer(text=f"Job ID: {job.id}")
@@ -0,0 +1,42 @@
+"""
+JSON helpers for the bot.
+
+Uses orjson when it is installed and falls back to the stdlib json module
+otherwise. orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers
+can keep catching json.JSONDecodeError either way.
+"""
+
+import copy
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Parse a JSON document from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize an object to a JSON string."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def clone(obj: Any) -> Any:
+    """
+    Deep-copy a JSON-shaped object (dicts, lists, str, numbers, bool, None).
+
+    With orjson this is a dump/load round trip in C, which is much faster
+    than copy.deepcopy for large workflow graphs.
+    """
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(obj))
+    return copy.deepcopy(obj)
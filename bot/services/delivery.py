@@ -1,7 +1,9 @@
+import asyncio
 import discord
 import io
-import json
 import logging
+import time
+from collections import OrderedDict
 from typing import Any, Optional, Union
 
 from ..comfyui.client import ComfyUIClient
@@ -9,6 +11,15 @@ from ..embeds.builders import EmbedBuilder
 
 logger = logging.getLogger(__name__)
 
+# Images of one job fetched from ComfyUI at the same time
+MAX_CONCURRENT_DOWNLOADS = 8
+
+# Users fetched over REST are not added to discord.py's cache; this many of the
+# most recently used ones are kept so repeat deliveries skip the round trip
+USER_CACHE_SIZE = 256
+# Seconds before a fetched user is fetched again, to pick up renames
+USER_CACHE_TTL = 600.0
+
 
 class DeliveryService:
     """Handles delivery of results to Discord."""
@@ -16,31 +27,47 @@ class DeliveryService:
     def __init__(self, bot: discord.Client, comfy_client: ComfyUIClient):
         self.bot = bot
         self.client = comfy_client
+        # discord_id -> (fetched_at, user), least recently used first
+        self._fetched_users: OrderedDict[int, tuple[float, discord.User]] = OrderedDict()
+
+    async def _resolve_user(self, discord_id: int) -> discord.User:
+        """Get a user from the client cache, a recent fetch, or the API."""
+        user = self.bot.get_user(discord_id)
+        if user is not None:
+            return user
+
+        entry = self._fetched_users.get(discord_id)
+        if entry and time.monotonic() - entry[0] < USER_CACHE_TTL:
+            self._fetched_users.move_to_end(discord_id)
+            return entry[1]
+
+        user = await self.bot.fetch_user(discord_id)
+        self._fetched_users[discord_id] = (time.monotonic(), user)
+        self._fetched_users.move_to_end(discord_id)
+        if len(self._fetched_users) > USER_CACHE_SIZE:
+            self._fetched_users.popitem(last=False)
+        return user
 
     async def _get_destination(
         self, job: Any
     ) -> Optional[Union[discord.User, discord.TextChannel]]:
         """Get the destination channel or user for a job."""
+        user_discord_id = job.user.discord_id
+
         if job.delivery_type == "dm":
             try:
-                user = self.bot.get_user(int(job.user.discord_id))
-                if not user:
-                    user = await self.bot.fetch_user(int(job.user.discord_id))
-                return user
+                return await self._resolve_user(user_discord_id)
             except Exception as e:
                 logger.error(f"Failed to fetch user for DM: {e}")
                 return None
 
         if job.channel_id:
-            destination = self.bot.get_channel(int(job.channel_id))
+            destination = self.bot.get_channel(job.channel_id)
             if destination:
                 return destination
             # Fallback to DM if channel not found
             try:
-                user = self.bot.get_user(int(job.user.discord_id))
-                if not user:
-                    user = await self.bot.fetch_user(int(job.user.discord_id))
-                return user
+                return await self._resolve_user(user_discord_id)
             except Exception:
                 pass
 
@@ -79,29 +106,36 @@ class DeliveryService:
             )
             return False
 
+    async def _download_image(
+        self, img_meta: dict, semaphore: asyncio.Semaphore
+    ) -> Optional[discord.File]:
+        """Fetch one output image as a discord.File, or None if it fails."""
+        filename = img_meta.get("filename")
+        subfolder = img_meta.get("subfolder", "")
+        img_type = img_meta.get("type", "output")
+
+        try:
+            async with semaphore:
+                buffer = io.BytesIO()
+                await self.client.stream_image(buffer, filename, subfolder, img_type)
+            buffer.seek(0)
+            return discord.File(buffer, filename=filename)
+        except Exception as e:
+            logger.error(f"Failed to download image {filename}: {e}")
+            return None
+
     async def deliver_job(self, job: Any):  # job: Job model
         """Deliver results for a completed job."""
         if not job.output_images:
             logger.warning(f"Job {job.id} completed but has no images.")
             return
 
-        try:
-            images_data = json.loads(job.output_images)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse output images for job {job.id}")
-            return
-
-        files = []
-        for img_meta in images_data:
-            filename = img_meta.get("filename")
-            subfolder = img_meta.get("subfolder", "")
-            img_type = img_meta.get("type", "output")
-            
-            try:
-                img_bytes = await self.client.get_image(filename, subfolder, img_type)
-                files.append(discord.File(io.BytesIO(img_bytes), filename=filename))
-            except Exception as e:
-                logger.error(f"Failed to download image {filename}: {e}")
+        # Download all images concurrently; gather keeps them in output order
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        downloads = await asyncio.gather(
+            *(self._download_image(img_meta, semaphore) for img_meta in job.output_images)
+        )
+        files = [file for file in downloads if file is not None]
 
         if not files:
             logger.warning("No files to upload.")
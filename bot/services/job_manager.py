@@ -1,18 +1,26 @@
 import asyncio
 import logging
-import json
 import uuid
 from datetime import datetime
 from typing import Optional, Dict, List, Any
 
+import aiohttp
+
 from ..database.repository import Repository
-from ..database.models import JobStatus, Job
+from ..database.models import FINISHED_JOB_STATUSES, JobStatus, Job
 from ..comfyui.client import ComfyUIClient
 from ..comfyui.websocket import ComfyUIWebSocket
 from .delivery import DeliveryService
 
 logger = logging.getLogger(__name__)
 
+# Job priorities: lower numbers run sooner. Anything more urgent than the
+# default is queued at the front of ComfyUI's queue.
+DEFAULT_PRIORITY = 5
+
+# Seconds to wait for further outputs of a finished job before delivering it
+DELIVERY_DEBOUNCE = 1.0
+
 class JobManager:
     """Manages the lifecycle of generation jobs."""
 
@@ -23,10 +31,10 @@ class JobManager:
         self.delivery = delivery_service
         # Use common client_id from WebSocket
         self.client_id = comfy_ws.client_id
-        
-        # In-memory mapping of prompt_id -> current status buffer
-        self._active_jobs = {} 
-        self._delivery_tasks = {} # prompt_id -> asyncio.Task 
+
+        self._delivery_timers: Dict[str, asyncio.TimerHandle] = {}
+        # Running deliveries; referenced here so they are not garbage collected
+        self._deliveries: set = set()
 
     async def start(self):
         """Start listening to WebSocket events."""
@@ -39,34 +47,39 @@ class JobManager:
         logger.info(f"JobManager started with client_id: {self.client_id}")
 
     async def create_job(self, 
-                         user_discord_id: str, 
+                         user_discord_id: int, 
                          workflow: Dict[str, Any],
                          positive_prompt: str,
                          negative_prompt: str = "",
                          parameters: Optional[Dict] = None,
-                         server_discord_id: Optional[str] = None, 
-                         channel_id: Optional[str] = None,
-                         delivery_type: str = "channel") -> Job:
-        """Submit a job to ComfyUI and database."""
-        
-        # 0. Validate and ensure entities exist
-        user = await self.repo.get_or_create_user(user_discord_id, "Unknown")
-        
-        # Check queue limit
-        current_queue_count = await self.repo.count_user_pending_jobs(user_discord_id, server_discord_id)
+                         server_discord_id: Optional[int] = None, 
+                         channel_id: Optional[int] = None,
+                         delivery_type: str = "channel",
+                         priority: int = DEFAULT_PRIORITY) -> Job:
+        """
+        Submit a job to ComfyUI and database.
+
+        ComfyUI owns the execution queue, so priority is mapped onto its
+        front-of-queue flag rather than a second local queue.
+        """
         
-        # Get server specific limit or default
-        max_queue = 3
-        if server_discord_id:
-            server = await self.repo.get_server(server_discord_id)
-            if server:
-                max_queue = server.max_queue_per_user
-                
+        # 0. Validate and ensure entities exist; one transaction for all checks
+        async with self.repo.transaction() as session:
+            await self.repo.get_or_create_user(user_discord_id, "Unknown", session=session)
+
+            # Queue count and the server's limit (default 3) come from one query
+            current_queue_count, server_max_queue = await self.repo.get_queue_usage(
+                user_discord_id, server_discord_id, session=session
+            )
+            max_queue = server_max_queue if server_max_queue is not None else 3
+
         if current_queue_count >= max_queue:
             raise ValueError(f"Queue limit reached ({max_queue} jobs). Please wait for your current jobs to finish.")
 
         # 1. Submit to ComfyUI
-        response = await self.client.queue_prompt(workflow, self.client_id)
+        response = await self.client.queue_prompt(
+            workflow, self.client_id, front=priority < DEFAULT_PRIORITY
+        )
         prompt_id = response.get("prompt_id")
         
         if not prompt_id:
@@ -81,7 +94,7 @@ class JobManager:
             positive_prompt=positive_prompt,
             negative_prompt=negative_prompt,
             parameters=parameters,
-            workflow_json=json.dumps(workflow),
+            workflow_json=workflow,
             delivery_type=delivery_type
         )
         
@@ -94,48 +107,90 @@ class JobManager:
         if not job:
             return False
             
-        if job.status in [JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value]:
+        if job.status in FINISHED_JOB_STATUSES:
             return False
 
+        # The ComfyUI requests are best-effort; run them alongside the DB update
+        requests = [self._dequeue([job.prompt_id])]
         if job.status == JobStatus.RUNNING.value:
-            await self.client.interrupt()
-        
-        # Remove from queue if pending
+            requests.append(self._interrupt())
+        status_update, *request_results = await asyncio.gather(
+            self.repo.update_job_status(job.prompt_id, JobStatus.CANCELLED.value),
+            *requests,
+            return_exceptions=True,
+        )
+        self._log_request_failures(request_results)
+        if isinstance(status_update, BaseException):
+            raise status_update
+        return True
+
+    async def cancel_jobs(self, job_ids: List[int]) -> int:
+        """
+        Cancel several jobs with one DB update.
+
+        Sends at most one interrupt (only if one of the jobs is running)
+        and a single queue delete request for all of them.
+
+        Returns:
+            Number of jobs cancelled
+        """
+        cancelled = await self.repo.cancel_jobs(job_ids)
+        if not cancelled:
+            return 0
+
+        # Remove pending entries from ComfyUI's queue
+        requests = [self._dequeue([prompt_id for prompt_id, _ in cancelled])]
+        if any(status == JobStatus.RUNNING.value for _, status in cancelled):
+            requests.append(self._interrupt())
+        self._log_request_failures(await asyncio.gather(*requests, return_exceptions=True))
+
+        return len(cancelled)
+
+    @staticmethod
+    def _log_request_failures(results: List[Any]):
+        """Log unexpected errors from best-effort ComfyUI requests instead of failing the cancel."""
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"ComfyUI request failed while cancelling: {result!r}")
+
+    async def _interrupt(self):
+        """Interrupt the running ComfyUI prompt, logging instead of raising on failure."""
         try:
-             await self.client.delete_queue_item(job.prompt_id)
-        except:
-             pass 
+            await self.client.interrupt()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to interrupt running job: {e}")
 
-        await self.repo.update_job_status(job.prompt_id, JobStatus.CANCELLED.value)
-        return True
+    async def _dequeue(self, prompt_ids: List[str]):
+        """Remove prompts from ComfyUI's queue, logging instead of raising on failure."""
+        try:
+            await self.client.delete_queue_items(prompt_ids)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Failed to delete queue items: {e}")
 
-    async def _schedule_delivery(self, job: Job):
+    def _schedule_delivery(self, job: Job):
         """Schedule a debounced delivery for a job."""
-        prompt_id = job.prompt_id
-        
-        # Cancel existing timer if any
-        if prompt_id in self._delivery_tasks:
-            self._delivery_tasks[prompt_id].cancel()
-            
-        # Create new timer
-        task = asyncio.create_task(self._deliver_delayed(job))
-        self._delivery_tasks[prompt_id] = task
-        
-        # Cleanup callback
-        def cleanup(t):
-            if prompt_id in self._delivery_tasks and self._delivery_tasks[prompt_id] == t:
-                self._delivery_tasks.pop(prompt_id, None)
-                
-        task.add_done_callback(cleanup)
-
-    async def _deliver_delayed(self, job: Job):
-        """Wait briefly then deliver the job."""
+        # A newer output restarts the debounce window
+        timer = self._delivery_timers.pop(job.prompt_id, None)
+        if timer:
+            timer.cancel()
+            logger.debug(f"Job {job.id} delivery debounced.")
+
+        self._delivery_timers[job.prompt_id] = asyncio.get_running_loop().call_later(
+            DELIVERY_DEBOUNCE, self._start_delivery, job
+        )
+
+    def _start_delivery(self, job: Job):
+        """Timer callback: start delivering the job once the window passes."""
+        self._delivery_timers.pop(job.prompt_id, None)
+        logger.info(f"Job {job.id} delivery timer expired. Delivering results...")
+        task = asyncio.create_task(self._deliver(job))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, job: Job):
+        """Deliver the job, logging instead of raising on failure."""
         try:
-            await asyncio.sleep(1.0) # Debounce window
-            logger.info(f"Job {job.id} delivery timer expired. Delivering results...")
             await self.delivery.deliver_job(job)
-        except asyncio.CancelledError:
-            logger.debug(f"Job {job.id} delivery debounced/cancelled.")
         except Exception as e:
             logger.error(f"Error in delayed delivery for job {job.id}: {e}")
 
@@ -184,12 +239,13 @@ class JobManager:
             job = await self.repo.update_job_status(
                 prompt_id, 
                 JobStatus.COMPLETED.value, 
-                output_images=images
+                output_images=images,
+                load_user=True,
             )
             
             if job:
                 logger.info(f"Job {job.id} update received. Scheduling delivery...")
-                await self._schedule_delivery(job)
+                self._schedule_delivery(job)
 
     async def _on_execution_error(self, data: Dict[str, Any]):
         msg = data.get("data", {})
@@ -200,7 +256,7 @@ class JobManager:
         if prompt_id:
             error_msg = f"{exception_type}: {exception_message}"
             job = await self.repo.update_job_status(
-                prompt_id, JobStatus.FAILED.value, error_message=error_msg
+                prompt_id, JobStatus.FAILED.value, error_message=error_msg, load_user=True
             )
 
             # Deliver error notification to user
@@ -1,5 +1,8 @@
 import logging
-from typing import Optional, List, Dict, Union
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, List, Dict, Mapping, Tuple, Union
 import discord
 from enum import Enum
 
@@ -8,25 +11,60 @@ from ..database.models import PermissionLevel, ServerRole, User
 
 logger = logging.getLogger(__name__)
 
+# Cached role mappings are reloaded after this many seconds, so changes made
+# outside /setrole (another process, manual DB edits) are picked up
+ROLE_CACHE_TTL = 60.0
+# Guilds whose role mappings are kept; the least recently used is evicted
+ROLE_CACHE_SIZE = 1024
+
 class Permissions(Enum):
     USER = "user"
     GENERATOR = "generator"
     ADMIN = "admin"
 
+# Permission level -> rank; higher ranks include everything below them
+_HIERARCHY: Mapping[str, int] = MappingProxyType({
+    Permissions.USER.value: 1,
+    Permissions.GENERATOR.value: 2,
+    Permissions.ADMIN.value: 3,
+})
+
 class PermissionService:
     """Manages role-based permissions."""
 
     def __init__(self, repository: Repository):
         self.repo = repository
+        # guild_id -> (loaded_at, {role_discord_id: permission_level}), LRU order
+        self._role_cache: OrderedDict[int, Tuple[float, Dict[int, str]]] = OrderedDict()
 
-    def get_permission_hierarchy(self) -> Dict[str, int]:
-        return {
-            Permissions.USER.value: 1,
-            Permissions.GENERATOR.value: 2,
-            Permissions.ADMIN.value: 3
-        }
+    async def _load(self, guild_id: int) -> Dict[int, str]:
+        """Get the role -> level mapping for a guild, loading it on cache miss."""
+        entry = self._role_cache.get(guild_id)
+        if entry and time.monotonic() - entry[0] < ROLE_CACHE_TTL:
+            self._role_cache.move_to_end(guild_id)
+            return entry[1]
 
+        server_roles = await self.repo.get_server_roles(guild_id)
+        # Highest level first, so get_user_permission_level can stop at the
+        # first role the member has; unknown levels are dropped
+        ranked = sorted(
+            (r for r in server_roles if r.permission_level in _HIERARCHY),
+            key=lambda r: _HIERARCHY[r.permission_level],
+            reverse=True,
+        )
+        roles = {r.role_discord_id: r.permission_level for r in ranked}
+        self._role_cache[guild_id] = (time.monotonic(), roles)
+        self._role_cache.move_to_end(guild_id)
+        if len(self._role_cache) > ROLE_CACHE_SIZE:
+            self._role_cache.popitem(last=False)
+        return roles
 
+    def invalidate(self, guild_id: int) -> None:
+        """Drop cached role mappings for a guild after they change."""
+        self._role_cache.pop(guild_id, None)
+
+    def get_permission_hierarchy(self) -> Mapping[str, int]:
+        return _HIERARCHY
 
     async def get_user_permission_level(self, member: Union[discord.Member, discord.User]) -> str:
         """
@@ -42,33 +80,25 @@ class PermissionService:
             return Permissions.ADMIN.value
 
         # Fetch configured roles for this server
-        server_roles = await self.repo.get_server_roles(str(member.guild.id))
+        server_roles = await self._load(member.guild.id)
         
         if not server_roles:
             return Permissions.USER.value
 
-        hierarchy = self.get_permission_hierarchy()
-        current_level = Permissions.USER.value
-        current_score = hierarchy[current_level]
+        # Configured roles are ordered highest level first: the first one the
+        # member has is their level
+        member_role_ids = {r.id for r in member.roles}
 
-        # Check user's roles against configured roles
-        member_role_ids = [str(r.id) for r in member.roles]
-        
-        for server_role in server_roles:
-            if server_role.role_discord_id in member_role_ids:
-                level = server_role.permission_level
-                if level in hierarchy and hierarchy[level] > current_score:
-                    current_level = level
-                    current_score = hierarchy[level]
-        
-        return current_level
+        for role_discord_id, level in server_roles.items():
+            if role_discord_id in member_role_ids:
+                return level
+
+        return Permissions.USER.value
 
     async def check_permission(self, member: discord.Member, required_level: str) -> bool:
         """Check if user meets the required permission level."""
         user_level = await self.get_user_permission_level(member)
-        hierarchy = self.get_permission_hierarchy()
-        
-        return hierarchy.get(user_level, 0) >= hierarchy.get(required_level, 0)
+        return _HIERARCHY.get(user_level, 0) >= _HIERARCHY.get(required_level, 0)
 
 # Helper decorator for checking permissions in commands
 def require_permission(level: str):
@@ -0,0 +1,220 @@
+"""
+Tests for the bot's database Repository.
+
+Run tests with: python -m pytest tests/test_bot_repository.py -v
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.database.models import JobStatus
+from bot.database.repository import Repository, _engines
+
+
+class TestLegacyPromptIds(unittest.IsolatedAsyncioTestCase):
+    """Jobs saved with text prompt IDs by older versions stay reachable."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = f"sqlite+aiosqlite:///{os.path.join(self.tmpdir, 'bot.db')}"
+        self.prompt_id = str(uuid.uuid4())
+
+        # Seed a job the way older versions stored it: prompt_id as text
+        repo = Repository(self.url)
+        await repo.init_db()
+        await repo.get_or_create_user(1, "alice")
+        async with repo.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO jobs (prompt_id, user_id, status, delivery_type) "
+                    "VALUES (:prompt_id, (SELECT id FROM users WHERE discord_id = 1), "
+                    "'pending', 'channel')"
+                ),
+                {"prompt_id": self.prompt_id},
+            )
+        await repo.close()
+
+        self.repo = Repository(self.url)
+        await self.repo.init_db()
+
+    async def asyncTearDown(self):
+        await self.repo.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def test_prompt_id_is_reencoded(self):
+        """init_db should rewrite text prompt IDs as UUID bytes."""
+        async with self.repo.engine.connect() as conn:
+            stored = (await conn.execute(text("SELECT prompt_id FROM jobs"))).scalar_one()
+        self.assertEqual(stored, uuid.UUID(self.prompt_id).bytes)
+
+    async def test_get_job(self):
+        """Legacy jobs should be found by prompt ID."""
+        job = await self.repo.get_job(self.prompt_id)
+        self.assertIsNotNone(job)
+        self.assertEqual(job.prompt_id, self.prompt_id)
+
+    async def test_update_job_status(self):
+        """Legacy jobs should accept status updates by prompt ID."""
+        job = await self.repo.update_job_status(self.prompt_id, JobStatus.RUNNING.value)
+        self.assertIsNotNone(job)
+        self.assertEqual(job.status, JobStatus.RUNNING)
+
+    async def test_cancel_jobs(self):
+        """Cancelling a legacy job should update its row and free the queue slot."""
+        job = await self.repo.get_job(self.prompt_id)
+
+        cancelled = await self.repo.cancel_jobs([job.id])
+
+        self.assertEqual(cancelled, [(self.prompt_id, JobStatus.PENDING)])
+        job = await self.repo.get_job(self.prompt_id)
+        self.assertEqual(job.status, JobStatus.CANCELLED)
+        self.assertEqual(await self.repo.count_user_pending_jobs(1), 0)
+
+
+class TestPromptIdRoundTrip(unittest.IsolatedAsyncioTestCase):
+    """Prompt IDs read back exactly as they were written."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.repo = Repository(f"sqlite+aiosqlite:///{os.path.join(self.tmpdir, 'bot.db')}")
+        await self.repo.init_db()
+        await self.repo.get_or_create_user(1, "alice")
+
+    async def asyncTearDown(self):
+        await self.repo.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def assertRoundTrip(self, prompt_id):
+        job = await self.repo.create_job(prompt_id, 1, "prompt")
+        self.assertEqual(job.prompt_id, prompt_id)
+        found = await self.repo.get_job(prompt_id)
+        self.assertIsNotNone(found)
+        self.assertEqual(found.prompt_id, prompt_id)
+        updated = await self.repo.update_job_status(prompt_id, JobStatus.RUNNING.value)
+        self.assertEqual(updated.prompt_id, prompt_id)
+
+    async def test_canonical_uuid(self):
+        """Canonical UUIDs should round-trip."""
+        await self.assertRoundTrip(str(uuid.uuid4()))
+
+    async def test_sixteen_byte_non_uuid(self):
+        """A non-UUID ID of exactly 16 bytes should not be read back as a UUID."""
+        await self.assertRoundTrip("abcdefghijklmnop")
+
+    async def test_non_canonical_uuid(self):
+        """UUIDs in other spellings should keep their original form."""
+        await self.assertRoundTrip("0123456789ABCDEF0123456789ABCDEF")
+        await self.assertRoundTrip("{%s}" % uuid.uuid4())
+        await self.assertRoundTrip(str(uuid.uuid4()).upper())
+
+    async def test_fifteen_byte_non_uuid(self):
+        """A 15-byte ID, which one pad byte would make 16 bytes, should round-trip."""
+        await self.assertRoundTrip("abcdefghijklmno")
+
+
+class TestLegacyDefaultWorkflows(unittest.IsolatedAsyncioTestCase):
+    """Databases with several default workflows still start."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = f"sqlite+aiosqlite:///{os.path.join(self.tmpdir, 'bot.db')}"
+
+        # Older schemas had no uq_workflows_default, so defaults could pile up
+        repo = Repository(self.url)
+        await repo.init_db()
+        async with repo.engine.begin() as conn:
+            await conn.execute(text("DROP INDEX uq_workflows_default"))
+            for name in ("first", "second"):
+                await conn.execute(
+                    text(
+                        "INSERT INTO workflows (name, workflow_json, is_default) "
+                        "VALUES (:name, '{}', 1)"
+                    ),
+                    {"name": name},
+                )
+        await repo.close()
+
+        self.repo = Repository(self.url)
+        await self.repo.init_db()
+
+    async def asyncTearDown(self):
+        await self.repo.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def test_newest_default_kept(self):
+        """init_db should keep only the newest default and create the index."""
+        workflow = await self.repo.get_default_workflow()
+        self.assertEqual(workflow.name, "second")
+        async with self.repo.engine.connect() as conn:
+            index = await conn.execute(
+                text("SELECT name FROM sqlite_master WHERE name = 'uq_workflows_default'")
+            )
+            self.assertIsNotNone(index.scalar_one_or_none())
+
+
+class TestCreateJob(unittest.IsolatedAsyncioTestCase):
+    """create_job reports unknown users without masking other errors."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.repo = Repository(f"sqlite+aiosqlite:///{os.path.join(self.tmpdir, 'bot.db')}")
+        await self.repo.init_db()
+
+    async def asyncTearDown(self):
+        await self.repo.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def test_unknown_user(self):
+        """An unknown user should raise ValueError."""
+        with self.assertRaisesRegex(ValueError, "User 42 not found"):
+            await self.repo.create_job(str(uuid.uuid4()), 42, "prompt")
+
+    async def test_duplicate_prompt_id(self):
+        """A duplicate prompt ID should surface as the IntegrityError it is."""
+        await self.repo.get_or_create_user(1, "alice")
+        prompt_id = str(uuid.uuid4())
+        await self.repo.create_job(prompt_id, 1, "prompt")
+
+        with self.assertRaises(IntegrityError):
+            await self.repo.create_job(prompt_id, 1, "prompt")
+
+
+class TestSharedEngine(unittest.IsolatedAsyncioTestCase):
+    """Repositories on one URL share an engine until the last one closes."""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = f"sqlite+aiosqlite:///{os.path.join(self.tmpdir, 'bot.db')}"
+
+    async def asyncTearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    async def test_close_keeps_engine_for_other_holders(self):
+        """Closing one repository should not dispose the engine another still uses."""
+        first = Repository(self.url)
+        second = Repository(self.url)
+        self.assertIs(first.engine, second.engine)
+        await first.init_db()
+
+        await first.close()
+        await first.close()  # closing twice releases only one hold
+        self.assertIn(self.url, _engines)
+        user = await second.get_or_create_user(1, "alice")
+        self.assertEqual(user.username, "alice")
+
+        await second.close()
+        self.assertNotIn(self.url, _engines)
+
+
+if __name__ == "__main__":
+    unittest.main()